@@ -1,16 +1,16 @@
 import fastf1 as ff1
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 from datetime import datetime
 import numpy as np
 import pandas as pd
 
-
-try:
-    ff1.Cache.enable_cache("cache")
-except:
-    pass
+from session_store import RESULTS, load_compact, load_session
+from stint_model import stint_table
+from circuit_index import circuit_index
+from results_store import results_store
+from metrics import report_error, timed
+from prediction import current_form
+from shared_cache import COMPLETED_TTL, LIVE_TTL, shared_result
+from track_rating import LOOKBACK_YEARS, first_race_per_year, rate_tracks, rating_records, rating_table, ratings_by_circuit
 
 
 def get_last_and_next_race(): # получение последей и следующей гонки
@@ -32,7 +32,7 @@ def get_last_and_next_race(): # получение последей и след
         return last_race, next_race
     
     except Exception as e:
-        print(f"Ошибка ff1 получения расписания: {e}")
+        report_error("get_last_and_next_race", f"Ошибка ff1 получения расписания: {e}")
         return None, None
 
 
@@ -57,14 +57,14 @@ def get_events_for_season(year): # список событий для сезон
             })
         return events
     except Exception as e:
-        print(f"Ошибка загрузки событий для {year}: {e}")
+        report_error("get_events_for_season", f"Ошибка загрузки событий для {year}: {e}")
         return []
 
 
+@timed("processing")
 def get_drivers_for_session(year, event_name, session_type='R'): # список гонщиков для сессии
     try:
-        session = ff1.get_session(year, event_name, session_type)
-        session.load(laps=False, telemetry=False, weather=False)
+        session = load_session(year, event_name, session_type, RESULTS)
         drivers = []
         
         if hasattr(session, 'results') and session.results is not None:
@@ -78,9 +78,22 @@ def get_drivers_for_session(year, event_name, session_type='R'): # список
                 })
         return sorted(drivers, key=lambda x: x.get('position', 99))
     except Exception as e:
-        print(f"Ошибка загрузки гонщиков для {year} {event_name} {session_type}: {e}")
+        report_error("get_drivers_for_session", f"Ошибка загрузки гонщиков для {year} {event_name} {session_type}: {e}")
         return []
 
+def is_session_completed(year, event_name, session_type='R'): # завершенная сессия уже не изменится, ее можно долго кешировать
+    try:
+        schedule = circuit_index.schedule(year)
+        events = schedule[schedule["EventName"] == event_name]
+        if events.empty:
+            return False
+        session_date = events.iloc[0].get_session_date(session_type, utc=True)
+        return session_date + pd.Timedelta(hours=4) < pd.Timestamp.now(tz="UTC").tz_localize(None)
+    except Exception as e:
+        report_error("is_session_completed", f"Ошибка проверки завершения сессии {year} {event_name} {session_type}: {e}")
+        return False
+
+
 def get_session_types():
     return [
         {'value': 'R', 'name': 'Гонка (Race)'},
@@ -92,107 +105,50 @@ def get_session_types():
     ]
 
 
+@timed("processing")
+@shared_result(ttl=LIVE_TTL, seasonal=True) # после гонки все воркеры пересобирают главную одновременно, считает один
 def get_current_form(driver_count=10): # текущая форма гонщиков по последним гонкам
     try:
-        current_year = datetime.now().year
-        schedule = ff1.get_event_schedule(current_year)
-        completed_races = schedule[schedule["EventDate"] < datetime.now()]
-        if len(completed_races) < 2:
-            return []
-        
-        recent_races = completed_races.tail(3)
-        driver_points = {}
-        
-        for _, race in recent_races.iterrows():
-            try:
-                session = ff1.get_session(current_year, race.EventName, "R")
-                session.load()
-                for _, result in session.results.iterrows():
-                    driver = result["Abbreviation"]
-                    points = result["Points"]
-                    if driver not in driver_points:
-                        driver_points[driver] = []
-                    driver_points[driver].append(points)
-            except Exception as e:
-                print(f"Ошибка ff1 загрузки гонки {race.EventName}: {e}")
-                continue
-
-        driver_avg_points = []
-        for driver, points_list in driver_points.items():
-            avg_points = np.mean(points_list)
-            driver_avg_points.append({
-                "driver": driver,
-                "avg_points": round(avg_points, 1),
-                "races": len(points_list)
-            })
-        driver_avg_points.sort(key=lambda x: x["avg_points"], reverse=True)
-        return driver_avg_points[:driver_count]
+        return current_form(results_store.frame([datetime.now().year]), driver_count)
     
     except Exception as e:
-        print(f"Ошибка ff1 получения текущей формы: {e}")
+        report_error("get_current_form", f"Ошибка ff1 получения текущей формы: {e}")
         return []
 
 
+def get_track_results(track_name, years): # результаты первой гонки на трассе за каждый из годов
+    results = results_store.frame(years)
+    return first_race_per_year(results[results["Circuit"] == circuit_index.resolve(track_name)])
+
+
+@timed("processing")
+@shared_result(ttl=COMPLETED_TTL, seasonal=True) # по прошлым сезонам, за день не меняется
 def get_driver_track_rating(track_name, top_count=8): # рейтинг гонщиков на конкретной трассе по историческим данным
     try:
         current_year = datetime.now().year
-        driver_stats = {}
-        
-        for year in range(current_year - 3, current_year):
-            try:
-                schedule = ff1.get_event_schedule(year)
-                track_events = schedule[schedule["EventName"].str.contains(track_name, case=False, na=False)]
-                if not track_events.empty:
-                    event = track_events.iloc[0]
-                    session = ff1.get_session(year, event.EventName, "R")
-                    session.load()
-                    for _, result in session.results.iterrows():
-                        driver = result["Abbreviation"]
-                        points = result["Points"]
-                        position = result["Position"]
-                        if driver not in driver_stats:
-                            driver_stats[driver] = {
-                                "total_points": 0,
-                                "races_count": 0,
-                                "best_position": 99,
-                                "positions": []
-                            }
-                        driver_stats[driver]["total_points"] += points
-                        driver_stats[driver]["races_count"] += 1
-                        driver_stats[driver]["positions"].append(position)
-                        driver_stats[driver]["best_position"] = min(driver_stats[driver]["best_position"], position)
-                        
-            except Exception as e:
-                print(f"Ошибка анализа трассы {track_name} за {year}: {e}")
-                continue
-
-        driver_ratings = []
-        for driver, stats in driver_stats.items():
-            if stats["races_count"] >= 1:
-                avg_points = stats["total_points"] / stats["races_count"]
-                position_bonus = (20 - stats["best_position"]) * 0.5
-                consistency_bonus = min(5, 10 / np.std(stats["positions"]) if len(stats["positions"]) > 1 else 0)
-
-                rating = avg_points + position_bonus + consistency_bonus
-
-                driver_ratings.append({
-                    "driver": driver,
-                    "rating": round(rating, 1),
-                    "avg_points": round(avg_points, 1),
-                    "races": stats["races_count"],
-                    "best_pos": stats["best_position"]
-                })
-        return sorted(driver_ratings, key=lambda x: x["rating"], reverse=True)[:top_count]
+        track_results = get_track_results(track_name, range(current_year - LOOKBACK_YEARS, current_year))
+        return rating_records(rating_table(track_results, top_count=top_count))
         
     except Exception as e:
-        print(f"Ошибка расчета рейтинга трассы: {e}")
+        report_error("get_driver_track_rating", f"Ошибка расчета рейтинга трассы: {e}")
         return []
+
+
+@timed("processing")
+def get_calendar_ratings(top_count=8, season=None): # рейтинги сразу для всех трасс: {ключ трассы: [...]}
+    try:
+        season = season or datetime.now().year
+        results = results_store.frame(range(season - LOOKBACK_YEARS, season))
+        return ratings_by_circuit(rate_tracks(results, season, top_count=top_count))
+    except Exception as e:
+        report_error("get_calendar_ratings", f"Ошибка расчета рейтингов календаря: {e}")
+        return {}
     
 
+@timed("processing")
 def get_session_results(year, event_name, session_type='R'): # таблица результатов сессии
     try:
-        session = ff1.get_session(year, event_name, session_type)
-        session.load(laps=False, telemetry=False, weather=False)
+        session = load_session(year, event_name, session_type, RESULTS)
         
         results_list = []
         if session.results is not None and not session.results.empty:
@@ -210,23 +166,45 @@ def get_session_results(year, event_name, session_type='R'): # таблица р
                 })
         return results_list
     except Exception as e:
-        print(f"Ошибка получения результатов: {e}")
+        report_error("get_session_results", f"Ошибка получения результатов: {e}")
+        return []
+    
+
+@timed("processing")
+def get_stint_summary(year, event_name, session_type='R'): # таблица стинтов: шины, круги, темп и деградация
+    try:
+        table = stint_table(load_compact(year, event_name, session_type).index.laps, session_type)
+        if table.empty:
+            return []
+        
+        return [{
+            'driver': row.Driver,
+            'team': row.Team,
+            'stint': int(row.Stint),
+            'compound': row.Compound,
+            'laps': f"{row.StartLap}-{row.EndLap}",
+            'clean_laps': int(row.CleanLaps),
+            'pace': f"{int(row.Pace // 60)}:{row.Pace % 60:06.3f}" if pd.notna(row.Pace) else '-',
+            'degradation': f"{row.Degradation:+.3f}" if pd.notna(row.Degradation) else '-'
+        } for row in table.itertuples()]
+    except Exception as e:
+        report_error("get_stint_summary", f"Ошибка расчета стинтов: {e}")
         return []
     
 
 def get_last_race_winner(last_race_event): # получение победителя последней гонки
     try:
-        session = ff1.get_session(last_race_event.year, last_race_event.EventName, 'R')
-        session.load(laps=False, telemetry=False, weather=False)
+        results = results_store.frame([last_race_event.year])
+        race_results = results[results["Round"] == last_race_event.RoundNumber].sort_values("Position")
         
-        if not session.results.empty:
-            winner = session.results.iloc[0]
+        if not race_results.empty:
+            winner = race_results.iloc[0]
             return {
                 'name': winner['FullName'],
-                'abb': winner['Abbreviation'],
-                'team': winner['TeamName']
+                'abb': winner['Driver'],
+                'team': winner['Team']
             }
         return None
     except Exception as e:
-        print(f"Ошибка при получении победителя: {e}")
-        return None
\ No newline at end of file
+        report_error("get_last_race_winner", f"Ошибка при получении победителя: {e}")
+        return None
@@ -1,95 +1,71 @@
-from flask import Flask, render_template, jsonify, request
-import fastf1 as ff1 #fastf1 использует pandas dataframes
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from flask import Flask, Response, render_template, jsonify, request, make_response, abort, redirect, url_for
 import os
+import hashlib
 from datetime import datetime
 
-from plotting import create_gear_shifts_plot, create_pitstop_analysis, create_lap_time_plot, create_lap_times_analysis, create_position_changes_plot, create_speed_trace_plot, create_speed_visual_plot, create_track_map_plot, create_track_performance_chart
-from analysis_utils import (
-    get_available_seasons, 
-    get_events_for_season, 
-    get_drivers_for_session,
-    get_session_types,
-    get_last_and_next_race,
-    get_driver_track_rating,
-    get_current_form,
-    get_session_results
-)
-
-if not os.path.exists("cache"):
-    os.makedirs("cache")
-
-ff1.Cache.enable_cache("cache")
+from render_pool import render_pool
+from dashboard import DashboardRefresher, format_age
+from plot_cache import plot_cache
+from shared_cache import shared_cache
+from jobs import job_id, job_queue
+import metrics
+from metrics import report_error, timed
+from prediction import HISTORY_YEARS, expert_picks, track_winners
+from startup import lazy_import, preload
+
+# fastf1, pandas и matplotlib грузятся не при импорте app, а в preload: до fork или на первом запросе воркера
+analysis_utils = lazy_import("analysis_utils")
+plotting = lazy_import("plotting")
+payloads = lazy_import("session_data")
+store = lazy_import("session_store")
+prefetch = lazy_import("prefetch")
+
 app = Flask(__name__)
 
 
-def get_track_history(track_name, years_back=5): # получение истории трека гонщиков
+@app.before_request
+def start_timing(): # этапы запроса собираются в Server-Timing, видно в DevTools на вкладке Timing
+    preload() # уже выполнен - просто проверка флага
+    metrics.start_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    server_timing = metrics.finish_request(request.endpoint)
+    if server_timing:
+        response.headers["Server-Timing"] = server_timing
+    return response
+
+
+def render_page(template, **context): # render_template с замером этапа template
+    with timed("template"):
+        return render_template(template, **context)
+
+
+def get_track_history(track_name, years_back=HISTORY_YEARS): # получение истории трека гонщиков
     try:
         current_year = datetime.now().year
-        history = []
-
-        for year in range(current_year - years_back, current_year):
-            try:
-                schedule = ff1.get_event_schedule(year)
-                track_events = schedule[schedule["EventName"].str.contains(track_name, case=False, na=False)]
-                if not track_events.empty:
-                    event = track_events.iloc[0]
-                    session = ff1.get_session(year, event.EventName, "R")
-                    session.load()
-                    winner = session.results.iloc[0]
-                    history.append({
-                        "year": year,
-                        "winner": winner["FullName"],
-                        "team": winner["TeamName"],
-                        "points": winner["Points"]
-                    })
-            except Exception as e:
-                print(f"Ошибка ff1 загрузки данных за {year}: {e}")
-                continue
-        return history
+        return track_winners(analysis_utils.get_track_results(track_name, range(current_year - years_back, current_year)))
     
     except Exception as e:
-        print(f"Ошибка ff1 получения истории трассы: {e}")
+        report_error("get_track_history", f"Ошибка ff1 получения истории трассы: {e}")
         return []
 
 
-def generate_expert_prediction(next_race, track_history, current_form): # сам прогноз
-    if next_race is None or not track_history:
+def generate_expert_prediction(next_race, track_history, current_form): # сам прогноз, тот же расчет проверяет backtest.py
+    if next_race is None:
         return ""
-    track_name = next_race.EventName if hasattr(next_race, "EventName") else "предстоящей гонки"
-    
-    # анализ истории
-    recent_winners = [h["winner"] for h in track_history[-2:]] if track_history else []
-    dominant_teams = {}
-    for h in track_history:
-        team = h["team"]
-        dominant_teams[team] = dominant_teams.get(team, 0) + 1
-    
-    # анализ формы
-    top_drivers = [f["driver"] for f in current_form[:3]] if current_form else []
-    
-    # прогноз
+    picks = expert_picks(track_history, current_form)
+    if picks is None:
+        return ""
+
     predictions = []
-    
-    # если есть повторяющийся победитель
-    if len(recent_winners) >= 2 and recent_winners[0] == recent_winners[1]:
-        predictions.append(f"{recent_winners[0]} имеет хорошую историю на этой трассе")
-    
-    # самые успешные команды
-    if dominant_teams:
-        best_team = max(dominant_teams, key=dominant_teams.get)
-        if dominant_teams[best_team] >= 2:
-            predictions.append(f"{best_team} сильны на этой трассе")
-    
-    # текущая форма
-    if current_form:
-        predictions.append(f"{current_form[0]["driver"]} в лучшей форме")
-    
-    if not predictions:
-        predictions.append("")
-    
+    if picks["repeat_winner"]: # если есть повторяющийся победитель
+        predictions.append(f"{picks['repeat_winner']['winner']} имеет хорошую историю на этой трассе")
+    if picks["best_team"]: # самые успешные команды
+        predictions.append(f"{picks['best_team']} сильны на этой трассе")
+    if picks["form_leader"]: # текущая форма
+        predictions.append(f"{picks['form_leader']['driver']} в лучшей форме")
     return ".".join(predictions)
 
 
@@ -105,8 +81,8 @@ def create_prediction_blocks(next_race):
     
     track_name = next_race.EventName if hasattr(next_race, "EventName") else "Следующая гонка"
     track_history = get_track_history(track_name)
-    current_form = get_current_form()
-    track_rating = get_driver_track_rating(track_name)
+    current_form = analysis_utils.get_current_form()
+    track_rating = analysis_utils.get_driver_track_rating(track_name)
     expert_prediction = generate_expert_prediction(next_race, track_history, current_form)
     
     return {
@@ -120,12 +96,12 @@ def create_prediction_blocks(next_race):
 
 @app.route('/analysis') # страница анализа сессий
 def analysis_page():
-    seasons = get_available_seasons()
+    seasons = analysis_utils.get_available_seasons()
     current_year = 2025 
-    events = get_events_for_season(current_year)
-    session_types = get_session_types()
+    events = analysis_utils.get_events_for_season(current_year)
+    session_types = analysis_utils.get_session_types()
     
-    return render_template('analysis.html', 
+    return render_page('analysis.html', 
                          seasons=seasons, 
                          events=events,
                          session_types=session_types,
@@ -134,7 +110,7 @@ def analysis_page():
 
 @app.route('/api/events/<int:year>') # получение событий для сезона
 def get_events_html(year):
-    events = get_events_for_season(year)
+    events = analysis_utils.get_events_for_season(year)
     return jsonify({'events': events})
 
 
@@ -144,9 +120,34 @@ def get_drivers_list():
     year = int(data.get('year'))
     event = data.get('event')
     session_type = data.get('session')
-    drivers = get_drivers_for_session(year, event, session_type)
+    drivers = analysis_utils.get_drivers_for_session(year, event, session_type)
+    # пока пользователь выбирает гонщиков, в фоне грузим круги и телеметрию для графиков
+    prefetch.prefetcher.prefetch(data.get('client') or request.remote_addr, year, event, session_type)
+
+    return render_page('partials/checkboxes.html', drivers=drivers)
+
+
+@app.route('/api/prefetch/cancel', methods=['POST']) # выбор сессии поменялся, ожидающая предзагрузка больше не нужна
+def cancel_prefetch():
+    data = request.get_json(silent=True) or {}
+    prefetch.prefetcher.cancel(data.get('client') or request.remote_addr)
+    return ('', 204)
+
 
-    return render_template('partials/checkboxes.html', drivers=drivers)
+@app.route('/api/cache_stats') # статистика кешей сессий и готовых графиков
+def cache_stats():
+    return jsonify({"sessions": store.session_store.stats(), "plots": plot_cache.stats(), "prefetch": prefetch.prefetcher.stats(), "jobs": job_queue.stats(),
+                    "shared": shared_cache.stats()})
+
+
+@app.route('/metrics') # гистограммы этапов и ответов, счетчики ошибок в формате Prometheus
+def metrics_page():
+    return Response(metrics.expose(), mimetype="text/plain; version=0.0.4")
+
+
+def submit_analysis(year, event, session, selected_drivers): # ставит задачу анализа или присоединяется к идущей, возвращает id
+    drivers = sorted(selected_drivers)
+    return job_queue.submit([year, event, session, drivers], analysis_steps(year, event, session, drivers))
 
 
 @app.route('/perform_analysis', methods=['POST']) # выполнение анализа сессии
@@ -157,58 +158,224 @@ def perform_analysis():
     
     selected_drivers = request.form.getlist('drivers')
 
-    plot_data = create_lap_time_plot(year, event, session, selected_drivers)
-    track_map = create_track_map_plot(year, event, session)
-    session_results = get_session_results(year, event, session)
-    gear_shifts = create_gear_shifts_plot(year, event, session)
-    speed_map = create_speed_visual_plot(year, event, session)
-    speed_trace = create_speed_trace_plot(year, event, session, selected_drivers)
-    pos_changes = create_position_changes_plot(year, event, session)
-    
-    return render_template('analysis_result.html', 
-                         plot_data=plot_data,
+    # анализ считается в фоне, страница результата открывается сразу и заполняется по мере готовности
+    submit_analysis(year, event, session, selected_drivers)
+    return redirect(url_for('analysis_result', year=year, event=event, session=session, drivers=",".join(selected_drivers)), code=303)
+
+
+@app.route('/analysis/result') # страница результата, сама ничего не считает: задачу ставит POST /perform_analysis
+def analysis_result():
+    year = request.args.get('year', type=int)
+    event = request.args.get('event')
+    session = request.args.get('session')
+    if year is None or not event or not session:
+        return redirect(url_for('analysis_page'))
+    selected_drivers = [d for d in request.args.get('drivers', '').split(',') if d]
+
+    return render_page('analysis_result.html', 
                          year=year,
                          event=event,
+                         session=session,
                          drivers=selected_drivers,
-                         track_map=track_map,
-                         session_results=session_results,
-                         gear_shifts=gear_shifts,
-                         speed_map=speed_map,
-                         speed_trace=speed_trace,
-                         pos_changes=pos_changes)
+                         show_stints=session in STINT_SESSIONS,
+                         job_id=job_id([year, event, session, sorted(selected_drivers)]))
 
 
-@app.route("/") # главная страница
-def index():
-    last_race, next_race = get_last_and_next_race()
+@app.route('/api/jobs', methods=['POST']) # повторный запуск анализа со страницы результата, если готовый результат устарел
+def restart_analysis():
+    year = request.form.get('year', type=int)
+    event = request.form.get('event')
+    session = request.form.get('session')
+    if year is None or not event or not session:
+        abort(400)
+    selected_drivers = [d for d in request.form.get('drivers', '').split(',') if d]
+    identifier = submit_analysis(year, event, session, selected_drivers)
+    return jsonify(job_queue.status(identifier) or {"id": identifier}), 202
+
+
+# графики страницы анализа: вид -> (функция plotting, нужны ли выбранные гонщики), по имени, чтобы не грузить plotting при импорте
+PLOT_KINDS = {
+    "lap_times": ("create_lap_time_plot", True),
+    "track_map": ("create_track_map_plot", False),
+    "gear_shifts": ("create_gear_shifts_plot", False),
+    "speed_map": ("create_speed_visual_plot", False),
+    "mini_sectors": ("create_mini_sector_plot", False),
+    "stints": ("create_stint_degradation_plot", False),
+    "speed_trace": ("create_speed_trace_plot", True),
+    "positions": ("create_position_changes_plot", False)
+}
+
+# графики прошедшей гонки с главной страницы
+RACE_PLOT_KINDS = {
+    "pitstops": "create_pitstop_analysis",
+    "race_laps": "create_lap_times_analysis"
+}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+LIVE_MAX_AGE = 5 * 60
+
+
+def cached_response(body, mimetype, immutable, content_encoding=None): # ответ со строгим ETag, завершенные сессии кешируются браузером и прокси надолго
+    response = make_response(body)
+    response.mimetype = mimetype
+    if content_encoding:
+        response.content_encoding = content_encoding
+    response.set_etag(hashlib.sha256(body).hexdigest()[:32])
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = LIVE_MAX_AGE
+    return response.make_conditional(request)
+
+
+def png_response(image, immutable):
+    return cached_response(image, "image/png", immutable)
+
+
+@app.route('/plot/<kind>/<int:year>/<event>/<session>.png') # отдельный график сессии
+def plot_image(kind, year, event, session):
+    if kind in PLOT_KINDS:
+        name, with_drivers = PLOT_KINDS[kind]
+        plot = getattr(plotting, name)
+        args = (year, event, session)
+        if with_drivers:
+            args += ([d for d in request.args.get("drivers", "").split(",") if d],)
+    elif kind in RACE_PLOT_KINDS and session == "R":
+        plot = getattr(plotting, RACE_PLOT_KINDS[kind])
+        args = (year, event)
+    else:
+        abort(404)
+
+    image = plot.png(*args, use_cache=request.args.get("nocache") != "1")
+    if not image:
+        abort(404)
+    return png_response(image, immutable=analysis_utils.is_session_completed(year, event, session))
+
+
+# данные для графиков в браузере: вид -> (функция session_data, нужны ли выбранные гонщики)
+DATA_KINDS = {
+    "laps": ("get_lap_data", True),
+    "speed": ("get_speed_data", True),
+    "delta": ("get_delta_data", True),
+    "positions": ("get_position_data", False),
+    "minisectors": ("get_mini_sector_data", False),
+    "stints": ("get_stint_data", False)
+}
+
+
+@app.route('/api/session/<int:year>/<event>/<session>/<kind>') # колонки для отрисовки в браузере, ?format=bin - бинарный вид
+def session_data(year, event, session, kind):
+    if kind not in DATA_KINDS:
+        abort(404)
+    name, with_drivers = DATA_KINDS[kind]
+    get_data = getattr(payloads, name)
+    args = (year, event, session)
+    if with_drivers:
+        args += (sorted(d for d in request.args.get("drivers", "").split(",") if d),)
+
+    payload = get_data(*args)
+    if payload is None:
+        abort(404)
+    return data_response(payload, immutable=analysis_utils.is_session_completed(year, event, session))
+
+
+def data_response(payload, immutable): # JSON или бинарный вид по ?format=bin, сжатый, если клиент принимает gzip
+    body, mimetype = payloads.encode_payload(payload, binary=request.args.get("format") == "bin")
+
+    content_encoding = None
+    if "gzip" in request.accept_encodings:
+        compressed = payloads.gzip_body(body)
+        if compressed is not None:
+            body, content_encoding = compressed, "gzip"
+    response = cached_response(body, mimetype, immutable=immutable, content_encoding=content_encoding)
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+STINT_SESSIONS = ("R", "S", "FP1", "FP2", "FP3") # в квалификации стинты слишком короткие для оценки деградации
+
+
+def analysis_steps(year, event, session, drivers): # шаги задачи анализа в порядке выполнения: сначала то, что грузится быстрее
+    steps = {
+        "results": (analysis_utils.get_session_results, (year, event, session)),
+        "laps": (payloads.get_lap_data, (year, event, session, drivers)),
+        "positions": (payloads.get_position_data, (year, event, session)),
+        "track_map": (plotting.create_track_map_plot.png, (year, event, session)),
+        "gear_shifts": (plotting.create_gear_shifts_plot.png, (year, event, session)),
+        "speed_map": (plotting.create_speed_visual_plot.png, (year, event, session)),
+        "mini_sectors": (plotting.create_mini_sector_plot.png, (year, event, session))
+    }
+    if session in STINT_SESSIONS:
+        steps["stints"] = (analysis_utils.get_stint_summary, (year, event, session))
+        steps["stint_plot"] = (plotting.create_stint_degradation_plot.png, (year, event, session))
+    if len(drivers) >= 2:
+        steps["speed"] = (payloads.get_speed_data, (year, event, session, drivers))
+    return steps
+
+
+@app.route('/api/jobs/<job_id>') # состояние шагов анализа, его отдает любой воркер
+def job_status(job_id):
+    snapshot = job_queue.status(job_id) or abort(404)
+    return jsonify(snapshot)
+
+
+@app.route('/api/jobs/<job_id>/<step>') # результат готового шага: PNG, данные графика или таблица результатов
+def job_result(job_id, step):
+    snapshot = job_queue.status(job_id) or abort(404)
+    result = job_queue.result(job_id, step)
+    if result is None:
+        abort(404)
+    drivers = snapshot["key"][3]
+    if isinstance(result, bytes):
+        return png_response(result, immutable=False)
+    if isinstance(result, dict):
+        return data_response(result, immutable=False)
+    if step == "stints":
+        return render_page('partials/stints_table.html', stints=result, drivers=drivers)
+    return render_page('partials/results_table.html', session_results=result, drivers=drivers)
+
+
+def race_key(last_race): # по последней завершенной гонке видно, что пора пересобрать главную
+    if last_race is None:
+        return None
+    return f"{last_race.year} {last_race.EventName}"
+
+
+def current_race_key():
+    last_race, _ = analysis_utils.get_last_and_next_race()
+    return race_key(last_race)
+
+
+def build_index_context(): # полный контекст главной страницы: таблицы и графики
+    last_race, next_race = analysis_utils.get_last_and_next_race()
 
     last_race_name = ""
     last_track_rating = []
     last_race_results = []
     next_track_rating = []
-    current_form_data = get_current_form()
+    current_form_data = analysis_utils.get_current_form()
 
     if last_race is not None:
         last_race_name = last_race.EventName
 
-        last_track_rating = get_driver_track_rating(last_race_name, top_count=5)
+        last_track_rating = analysis_utils.get_driver_track_rating(last_race_name, top_count=5)
 
-        all_res = get_session_results(last_race.year, last_race_name, 'R')
+        all_res = analysis_utils.get_session_results(last_race.year, last_race_name, 'R')
         last_race_results = all_res[:5] if all_res else []
 
     next_race_name = "Сезон завершен"
     if next_race is not None:
         next_race_name = next_race.EventName
 
-        next_track_rating = get_driver_track_rating(next_race_name)
+        next_track_rating = analysis_utils.get_driver_track_rating(next_race_name)
     
-    pitstop_img = None
-    laptimes_img = None
-    track_img = None
+    race_plots = {}
 
     if last_race is not None and hasattr(last_race, "year"):
-        pitstop_img = create_pitstop_analysis(last_race.year, last_race.EventName)
-        laptimes_img = create_lap_times_analysis(last_race.year, last_race.EventName)
+        race_plots["pitstop_img"] = (plotting.create_pitstop_analysis.png, (last_race.year, last_race.EventName))
+        race_plots["laptimes_img"] = (plotting.create_lap_times_analysis.png, (last_race.year, last_race.EventName))
         
         last_race_date = last_race.EventDate.strftime("%d.%m.%Y") if hasattr(last_race.EventDate, "strftime") else str(last_race.EventDate)
         last_race_name = last_race.EventName
@@ -220,26 +387,62 @@ def index():
         next_race_date = next_race.EventDate.strftime("%d.%m.%Y") if hasattr(next_race.EventDate, "strftime") else str(next_race.EventDate)
         next_race_name = next_race.EventName
         
-        track_img = create_track_performance_chart(next_race_name)
+        race_plots["track_img"] = (plotting.create_track_performance_chart.png, (next_race_name,))
     else:
         next_race_date = "Неизвестно"
         next_race_name = "Сезон завершен"
 
+    images = render_pool.run(race_plots) # PNG байты, отдаются через /dashboard/<name>.png
+
     current_time = datetime.now().strftime("%d.%m.%Y %H:%M")
     
-    return render_template("index.html",
-                         last_race_name=last_race_name,
-                         last_race_date=last_race_date,
-                         last_track_rating=last_track_rating,
-                         last_race_results=last_race_results,
-                         next_race_name=next_race_name,
-                         next_race_date=next_race_date,
-                         track_rating=next_track_rating,
-                         pitstop_img=pitstop_img,
-                         laptimes_img=laptimes_img,
-                         track_img=track_img,
-                         current_time=current_time,
-                         current_form=current_form_data)
+    return {
+        "race_key": race_key(last_race),
+        "last_race_name": last_race_name,
+        "last_race_date": last_race_date,
+        "last_track_rating": last_track_rating,
+        "last_race_results": last_race_results,
+        "next_race_name": next_race_name,
+        "next_race_date": next_race_date,
+        "track_rating": next_track_rating,
+        "pitstop_img": images.get("pitstop_img"),
+        "laptimes_img": images.get("laptimes_img"),
+        "track_img": images.get("track_img"),
+        "current_time": current_time,
+        "current_form": current_form_data
+    }
+
+
+dashboard = DashboardRefresher(build_index_context, current_race_key)
+
+
+DASHBOARD_IMAGES = ("pitstop_img", "laptimes_img", "track_img")
+
+
+def image_version(image): # версия в адресе картинки меняется вместе со снимком, поэтому ее можно кешировать навсегда
+    return hashlib.sha256(image).hexdigest()[:12] if image else None
+
+
+@app.route("/") # главная страница
+def index():
+    snapshot = dashboard.get()
+    image_versions = {name: image_version(snapshot.context.get(name)) for name in DASHBOARD_IMAGES}
+    return render_page("index.html",
+                         snapshot_age=format_age(snapshot.age),
+                         image_versions=image_versions,
+                         **snapshot.context)
+
+
+@app.route("/dashboard/<name>.png") # графики главной страницы из снимка
+def dashboard_image(name):
+    image = dashboard.get().context.get(name) if name in DASHBOARD_IMAGES else None
+    if not image:
+        abort(404)
+    return png_response(image, immutable=request.args.get("v") == image_version(image))
+
+if os.environ.get("F1_PRELOAD") == "1": # gunicorn --preload: все тяжелое загружается в мастере один раз до fork
+    preload()
 
 if __name__ == "__main__":
+    preload()
     app.run()
\ No newline at end of file
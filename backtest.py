@@ -0,0 +1,256 @@
+# Проверка рейтинга гонщиков на трассе и экспертного прогноза на всех прошедших гонках и подбор коэффициентов.
+# Для каждой гонки рейтинг считается только по предыдущим сезонам и сравнивается с настоящим результатом.
+#
+#   python backtest.py                                   # сезоны с 2019 по прошлый, сетка коэффициентов по умолчанию
+#   python backtest.py --metric spearman --workers 8 --output backtest.json
+#   python backtest.py --weights 0,0.5,1 --scales 5,10 --caps 0,5 --lookbacks 3
+#
+# Данные берутся из локальных таблиц результатов (results_store.py), сессии fastf1 повторно не грузятся.
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from circuit_index import FIRST_SEASON
+from prediction import HISTORY_YEARS, current_form, expert_favourite, track_winners
+from track_rating import LOOKBACK_YEARS, RATING_COEFFICIENTS, first_race_per_year, rating_formula, rating_stats
+
+
+METRICS = {
+    "top3": "доля угаданных призеров в топ-3 рейтинга",
+    "winner": "доля гонок, где первый в рейтинге победил",
+    "spearman": "ранговая корреляция рейтинга и финишных позиций"
+}
+MIN_RATED = 3 # гонки, где история на трассе есть меньше чем у трех участников, не оцениваем
+CHUNK_SIZE = 64 # наборов коэффициентов в одной задаче пула
+
+DEFAULT_GRID = {
+    "position_weight": [0, 0.25, 0.5, 1, 2],
+    "consistency_scale": [5, 10, 20],
+    "consistency_cap": [0, 2.5, 5, 10], # 0 выключает бонус стабильности
+    "lookback": [2, 3, 4, 5]
+}
+# base_position в переборе не нужен: он одинаково сдвигает рейтинг всех гонщиков и не меняет порядок
+
+
+class Replay: # все оцениваемые гонки одного окна истории: массивы гонки × участник
+    def __init__(self, results, seasons, lookback):
+        frames = []
+        for season in seasons: # рейтинг на сезон - один групповой проход по всем трассам, как в rate_tracks
+            window = results[(results["Year"] >= season - lookback) & (results["Year"] < season)]
+            stats = rating_stats(first_race_per_year(window)).reset_index()
+            frames.append(results[results["Year"] == season].merge(stats, on=["Circuit", "Driver"], how="left"))
+        races = pd.concat(frames, ignore_index=True)
+
+        # участники гонки по алфавиту: при равном рейтинге порядок не должен подсказывать результат
+        races = races.sort_values(["Year", "Round", "Driver"], kind="stable")
+        race = races.groupby(["Year", "Round"], sort=False).ngroup().to_numpy()
+        slot = races.groupby(["Year", "Round"], sort=False).cumcount().to_numpy()
+        shape = (race.max() + 1, slot.max() + 1) if len(races) else (0, 0)
+
+        def dense(column, fill=np.nan):
+            array = np.full(shape, fill, dtype=np.float64)
+            array[race, slot] = races[column].to_numpy(dtype=np.float64)
+            return array
+
+        self.position = dense("Position")
+        self.avg_points = dense("total_points") / dense("races")
+        self.best_position = dense("best_position")
+        self.races = dense("races", 0)
+        self.position_std = dense("position_std")
+        self.rated = ~np.isnan(self.avg_points) # у гонщика есть история на этой трассе
+        self.scored = self.rated.sum(axis=1) >= MIN_RATED
+        self.labels = races.drop_duplicates(["Year", "Round"])[["Year", "Round", "EventName"]].to_numpy().tolist()
+
+
+def tied_ranks(values): # ранги по убыванию по последней оси, равным значениям - средний ранг; NaN в конце, каждый отдельно
+    order = np.argsort(-values, axis=-1, kind="stable")
+    ordered = np.take_along_axis(values, order, axis=-1)
+    size = values.shape[-1]
+    index = np.broadcast_to(np.arange(size, dtype=np.float64), values.shape)
+    starts = np.ones(values.shape, dtype=bool) # первый в группе равных значений
+    starts[..., 1:] = ordered[..., 1:] != ordered[..., :-1]
+    ends = np.ones(values.shape, dtype=bool) # последний в группе
+    ends[..., :-1] = starts[..., 1:]
+    first = np.maximum.accumulate(np.where(starts, index, 0), axis=-1)
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(ends, index, size - 1), axis=-1), axis=-1), axis=-1)
+    ranks = np.empty(values.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, (first + last) / 2, axis=-1)
+    return ranks
+
+
+def masked_spearman(rank, position, mask): # корреляция Пирсона рангов по последней оси только для отмеченных участников
+    count = mask.sum(axis=-1)
+    a = np.where(mask, rank, 0.0)
+    b = np.where(mask, position, 0.0)
+    a_mean = a.sum(axis=-1, keepdims=True) / np.maximum(count, 1)[..., None]
+    b_mean = b.sum(axis=-1, keepdims=True) / np.maximum(count, 1)[..., None]
+    a = np.where(mask, a - a_mean, 0.0)
+    b = np.where(mask, b - b_mean, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (a * b).sum(axis=-1) / np.sqrt((a * a).sum(axis=-1) * (b * b).sum(axis=-1))
+
+
+def score(replay, weights, scales, caps): # метрики для набора коэффициентов сразу: массивы длины G -> {метрика: (G,)}
+    coefficients = {
+        "base_position": RATING_COEFFICIENTS["base_position"],
+        "position_weight": weights[:, None, None],
+        "consistency_scale": scales[:, None, None],
+        "consistency_cap": caps[:, None, None]
+    }
+    rating = np.round(rating_formula(replay.avg_points, replay.best_position, replay.races, replay.position_std, coefficients), 1)
+    rating = np.where(replay.rated, rating, -np.inf) # без истории на трассе - в конце прогноза
+    rating = rating[:, replay.scored]
+    position = replay.position[replay.scored]
+
+    order = np.argsort(-rating, axis=-1, kind="stable") # прогноз: участники по убыванию рейтинга
+    predicted = np.take_along_axis(np.broadcast_to(position, rating.shape), order[..., :3], axis=-1)
+    finished = np.broadcast_to(~np.isnan(position), rating.shape)
+    # ранги только среди финишировавших; у гонщиков без истории (-inf) и при равном рейтинге ранг общий, без порядка по алфавиту
+    rank = tied_ranks(np.where(finished, rating, np.nan))
+
+    return {
+        "top3": (predicted <= 3).sum(axis=-1).mean(axis=-1) / 3,
+        "winner": (predicted[..., 0] == 1).mean(axis=-1),
+        "spearman": np.nanmean(masked_spearman(rank, np.broadcast_to(position, rating.shape), finished), axis=-1)
+    }
+
+
+_replays = {} # окно истории -> Replay, в процессах пула заполняется инициализатором
+
+
+def init_worker(replays):
+    _replays.update(replays)
+
+
+def score_chunk(lookback, combinations): # выполняется в процессе пула
+    weights, scales, caps = (np.array(column, dtype=np.float64) for column in zip(*combinations))
+    metrics = score(_replays[lookback], weights, scales, caps)
+    return [{
+        "lookback": lookback, "position_weight": w, "consistency_scale": s, "consistency_cap": c,
+        **{name: round(float(values[i]), 4) for name, values in metrics.items()}
+    } for i, (w, s, c) in enumerate(combinations)]
+
+
+def expert_favourites(results, seasons): # фаворит экспертного прогноза по каждой гонке: тот же расчет, что в generate_expert_prediction
+    picks = {}
+    for season in seasons:
+        history = first_race_per_year(results[(results["Year"] >= season - HISTORY_YEARS) & (results["Year"] < season)])
+        season_results = results[results["Year"] == season]
+        races = season_results[["Round", "Circuit"]].drop_duplicates().sort_values("Round")
+        for round_number, circuit in races.itertuples(index=False):
+            favourite = expert_favourite(
+                track_winners(history[history["Circuit"] == circuit]),
+                current_form(season_results[season_results["Round"] < round_number]) # как на главной перед этой гонкой
+            )
+            if favourite is not None:
+                picks[(season, round_number)] = favourite
+    return picks
+
+
+def score_expert(results, picks):
+    finished = results.set_index(["Year", "Round", "Driver"])["Position"]
+    positions = [finished.get((year, round_number, driver), np.nan) for (year, round_number), driver in picks.items()]
+    positions = np.array(positions, dtype=np.float64)
+    return {"races": len(picks), "winner": round(float(np.mean(positions == 1)), 4) if len(picks) else None,
+            "podium": round(float(np.mean(positions <= 3)), 4) if len(picks) else None}
+
+
+def grid_from_args(args):
+    grid = dict(DEFAULT_GRID)
+    for name, value in (("position_weight", args.weights), ("consistency_scale", args.scales),
+                        ("consistency_cap", args.caps), ("lookback", args.lookbacks)):
+        if value:
+            grid[name] = [float(v) if name != "lookback" else int(v) for v in value.split(",")]
+    return grid
+
+
+def run(seasons, grid, metric="top3", workers=1, top=10, results=None):
+    started = time.perf_counter()
+    if results is None:
+        from results_store import results_store
+        from startup import init
+        init() # кеш fastf1 для догрузки недостающих сезонов
+        results = results_store.frame(range(FIRST_SEASON, max(seasons) + 1))
+    current = (LOOKBACK_YEARS, RATING_COEFFICIENTS["position_weight"], RATING_COEFFICIENTS["consistency_scale"], RATING_COEFFICIENTS["consistency_cap"])
+
+    lookbacks = sorted(set(grid["lookback"]) | {current[0]})
+    replays = {lookback: Replay(results, seasons, lookback) for lookback in lookbacks}
+    prepared = time.perf_counter() - started
+
+    combinations = list(itertools.product(grid["position_weight"], grid["consistency_scale"], grid["consistency_cap"]))
+    tasks = [(lookback, combinations[i:i + CHUNK_SIZE]) for lookback in grid["lookback"] for i in range(0, len(combinations), CHUNK_SIZE)]
+    tasks.append((current[0], [current[1:]])) # текущие коэффициенты считаются всегда, для сравнения
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(replays,)) as executor:
+        for chunk in executor.map(score_chunk, *zip(*tasks)):
+            rows.extend(chunk)
+    baseline = rows.pop()
+    rows.sort(key=lambda row: (row[metric], row["top3"], row["spearman"]), reverse=True)
+
+    expert = score_expert(results, expert_favourites(results, seasons))
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "seasons": [min(seasons), max(seasons)],
+        "races": {lookback: int(replay.scored.sum()) for lookback, replay in replays.items()},
+        "metric": metric,
+        "current": baseline,
+        "expert": expert,
+        "best": rows[:top],
+        "grid_size": len(rows),
+        "seconds": {"prepare": round(prepared, 2), "total": round(time.perf_counter() - started, 2)}
+    }
+    print_report(report)
+    return report, rows
+
+
+def format_row(row):
+    return (f"окно {row['lookback']} г., вес позиции {row['position_weight']:g}, стабильность {row['consistency_scale']:g}/"
+            f"{row['consistency_cap']:g}: топ-3 {row['top3']:.1%}, победитель {row['winner']:.1%}, Спирмен {row['spearman']:.3f}")
+
+
+def print_report(report):
+    print(f"Сезоны {report['seasons'][0]}-{report['seasons'][1]}, оценено гонок по окнам истории: {report['races']}")
+    print(f"Перебрано наборов: {report['grid_size']} за {report['seconds']['total']:.1f} с (подготовка {report['seconds']['prepare']:.1f} с)")
+    print(f"Текущие коэффициенты: {format_row(report['current'])}")
+    expert = report["expert"]
+    if expert["races"]:
+        print(f"Экспертный прогноз ({expert['races']} гонок): фаворит побеждал {expert['winner']:.1%}, на подиуме {expert['podium']:.1%}")
+    print(f"Лучшие по метрике {report['metric']} ({METRICS[report['metric']]}):")
+    for row in report["best"]:
+        print(f"  {format_row(row)}")
+
+
+def main():
+    current_year = datetime.now().year
+    parser = argparse.ArgumentParser(description="Бэктест рейтинга гонщиков на трассе и подбор коэффициентов")
+    parser.add_argument("--from", dest="first", type=int, default=FIRST_SEASON + 1, help="первый оцениваемый сезон, история берется до него")
+    parser.add_argument("--to", dest="last", type=int, default=current_year - 1)
+    parser.add_argument("--metric", choices=sorted(METRICS), default="top3")
+    parser.add_argument("--weights", default="", help="значения position_weight через запятую")
+    parser.add_argument("--scales", default="", help="значения consistency_scale через запятую")
+    parser.add_argument("--caps", default="", help="значения consistency_cap через запятую")
+    parser.add_argument("--lookbacks", default="", help="сколько предыдущих сезонов брать в рейтинг, через запятую")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="куда записать JSON со всеми наборами")
+    args = parser.parse_args()
+
+    report, rows = run(range(args.first, args.last + 1), grid_from_args(args), args.metric, max(1, args.workers), args.top)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**report, "all": rows}, f, ensure_ascii=False, indent=2, default=str)
+        print(f"Результаты записаны в {args.output}")
+    sys.exit(0 if report["grid_size"] else 1)
+
+
+if __name__ == "__main__":
+    main()
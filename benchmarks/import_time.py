@@ -0,0 +1,84 @@
+# Время запуска: сколько стоит импорт каждого модуля в чистом процессе (python -X importtime) и сколько - preload.
+# Каждый модуль импортируется в отдельном процессе, поэтому время включает все его зависимости.
+#
+#   python -m benchmarks.import_time --repeat 5 --output startup.json
+#   python -m benchmarks.import_time --modules app,plotting
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = (
+    "app", "startup", "analysis_utils", "plotting", "session_data", "session_store", "compact_session",
+    "results_store", "shared_cache", "plot_cache", "flask", "numpy", "pandas", "matplotlib.pyplot", "fastf1", "fastf1.plotting"
+)
+
+# импорт app и отдельно preload в одном процессе, как у воркера сервера
+PHASES_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+import startup
+startup.preload()
+print(json.dumps({"import_app": imported - started, "preload": time.perf_counter() - imported}))
+"""
+
+
+def python(args): # новый интерпретатор из корня проекта, кеши импорта уже не прогреты
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def import_time(module): # (собственное, с зависимостями) время импорта модуля в секундах
+    output = python(["-X", "importtime", "-c", f"import {module}"]).stderr
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == module and name.startswith(" ") and not name.startswith("   "): # верхний уровень, не вложенный импорт
+            return int(own) / 1e6, int(cumulative) / 1e6
+    raise RuntimeError(f"Нет строки импорта для {module}")
+
+
+def run(modules, repeat):
+    results = {}
+    for module in modules:
+        samples = [import_time(module) for _ in range(repeat)]
+        results[module] = {
+            "self_s": statistics.median(own for own, _ in samples),
+            "cumulative_s": statistics.median(cumulative for _, cumulative in samples)
+        }
+        r = results[module]
+        print(f"{module:30} {r['cumulative_s'] * 1000:9.1f} мс  собственное {r['self_s'] * 1000:7.1f} мс")
+
+    phases = [json.loads(python(["-c", PHASES_SCRIPT]).stdout.splitlines()[-1]) for _ in range(repeat)]
+    startup = {name: statistics.median(p[name] for p in phases) for name in ("import_app", "preload")}
+    print(f"{'import app':30} {startup['import_app'] * 1000:9.1f} мс")
+    print(f"{'startup.preload()':30} {startup['preload'] * 1000:9.1f} мс  (до fork или на первом запросе воркера)")
+    return results, startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта модулей и preload в чистом процессе")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modules", default=",".join(MODULES), help="модули через запятую")
+    parser.add_argument("--output", help="куда записать JSON с результатами")
+    args = parser.parse_args()
+
+    results, startup = run([m for m in args.modules.split(",") if m], args.repeat)
+    if args.output:
+        report = {"created": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0],
+                  "config": {"repeat": args.repeat}, "modules": results, "startup": startup}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты записаны в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
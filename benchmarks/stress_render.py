@@ -0,0 +1,94 @@
+# Стресс-тест параллельного рендера: N потоков рисуют одни и те же графики,
+# результат должен совпадать байт в байт, а память не должна расти от раунда к раунду.
+#
+#   python -m benchmarks.stress_render --year 2024 --event "Italian Grand Prix" --session R --threads 8 --rounds 5
+
+import argparse
+import gc
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotting
+from session_store import load_session
+from startup import init
+
+
+def rss_mb(): # текущий RSS процесса
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # пик, если /proc недоступен
+
+
+def plot_jobs(year, event, session, drivers):
+    return {
+        "lap_times": (plotting.create_lap_time_plot.png, (year, event, session, drivers)),
+        "track_map": (plotting.create_track_map_plot.png, (year, event, session)),
+        "gear_shifts": (plotting.create_gear_shifts_plot.png, (year, event, session)),
+        "speed_map": (plotting.create_speed_visual_plot.png, (year, event, session)),
+        "speed_trace": (plotting.create_speed_trace_plot.png, (year, event, session, drivers)),
+        "positions": (plotting.create_position_changes_plot.png, (year, event, session))
+    }
+
+
+def run(year, event, session, drivers, threads, rounds, tolerance_mb):
+    load_session(year, event, session) # загрузка сессии не должна попадать в замер
+    jobs = plot_jobs(year, event, session, drivers)
+    reference = {name: func(*args, use_cache=False) for name, (func, args) in jobs.items()}
+    failed = [name for name, image in reference.items() if not image]
+    if failed:
+        print(f"Не удалось нарисовать эталон: {', '.join(failed)}")
+        return False
+
+    ok = True
+    memory = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for round_number in range(rounds):
+            started = time.perf_counter()
+            futures = [
+                (name, executor.submit(func, *args, use_cache=False))
+                for _ in range(threads)
+                for name, (func, args) in jobs.items()
+            ]
+            mismatches = sum(1 for name, future in futures if future.result() != reference[name])
+            gc.collect()
+            memory.append(rss_mb())
+            print(f"раунд {round_number + 1}: {len(futures)} графиков за {time.perf_counter() - started:.2f} с, "
+                  f"несовпадений {mismatches}, RSS {memory[-1]:.0f} МБ")
+            ok = ok and mismatches == 0
+
+    growth = memory[-1] - memory[0]
+    print(f"рост памяти после первого раунда: {growth:.0f} МБ")
+    if growth > tolerance_mb:
+        print(f"Память растет больше допустимых {tolerance_mb} МБ")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельный рендер графиков на N потоках")
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--event", default="Italian Grand Prix")
+    parser.add_argument("--session", default="R")
+    parser.add_argument("--drivers", default="VER,LEC")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--tolerance-mb", type=float, default=50)
+    args = parser.parse_args()
+    init()
+
+    ok = run(args.year, args.event, args.session, args.drivers.split(","), args.threads, args.rounds, args.tolerance_mb)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
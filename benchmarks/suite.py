@@ -0,0 +1,319 @@
+# Микробенчмарки функций plotting.py, analysis_utils.py и session_data.py на синтетических сессиях, без сети.
+# Для каждой функции: время (медиана и минимум по повторам), пик памяти по tracemalloc и сколько блоков памяти осталось после вызова.
+#
+#   python -m benchmarks.suite --output bench.json
+#   python -m benchmarks.suite --baseline bench.json --threshold 0.2    # код возврата 1 при замедлении больше 20%
+#   python -m benchmarks.suite --filter create_ --repeat 3
+#
+# Перед замером проверяется, что быстрые версии считают то же, что и простые: при расхождении код возврата 1.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import synthetic
+
+
+NOISE_FLOOR = 0.002 # секунд, меньшие разницы не считаем регрессией
+TOLERANCE = 1e-6
+
+
+def check_resample_rows(): # одна интерполяция по всем строкам против np.interp по каждой строке
+    import numpy as np
+    from lap_compare import resample_rows
+
+    rng = np.random.default_rng(0)
+    positions, values = [], []
+    for _ in range(20):
+        size = int(rng.integers(50, 800))
+        positions.append(np.sort(rng.uniform(0.01, 0.99, size))) # строки начинаются после 0 и кончаются до 1
+        values.append(np.cumsum(rng.uniform(0, 1, size)))
+    grid = np.linspace(0.0, 1.0, 1000)
+    (result,) = resample_rows(positions, (values,), grid)
+    expected = np.array([np.interp(grid, p, v) for p, v in zip(positions, values)])
+    error = float(np.abs(result - expected).max())
+    return None if error < TOLERANCE else f"отклонение {error:.3g}"
+
+
+def check_stint_json(year, event): # ответ /api/session/.../stints - строгий JSON, стинты без оценки деградации - null
+    import numpy as np
+    import session_data
+
+    def reject(constant):
+        raise ValueError(f"{constant} в JSON")
+
+    payload = session_data.get_stint_data(year, event, "R")
+    if payload is None:
+        return "нет данных стинтов"
+    payload["stints"]["degradation"][0] = np.nan # короткий стинт, как с меньше чем MIN_STINT_LAPS чистыми кругами
+    decoded = json.loads(session_data.to_json(payload), parse_constant=reject)
+    if decoded["stints"]["degradation"][0] is not None:
+        return "NaN не заменен на null"
+    return None
+
+
+def check_binary_header(): # заголовок бинарного ответа - строгий JSON: NaN в метаданных - null, как в to_json
+    import struct
+    import numpy as np
+    from session_data import BINARY_MAGIC, to_binary
+
+    def reject(constant):
+        raise ValueError(f"{constant} в JSON")
+
+    body = to_binary({"best": np.nan, "drivers": {"VER": {"time": np.float32("inf"), "speed": np.arange(3, dtype=np.float32)}}})
+    length = struct.unpack("<I", body[len(BINARY_MAGIC):len(BINARY_MAGIC) + 4])[0]
+    header = json.loads(body[len(BINARY_MAGIC) + 4:len(BINARY_MAGIC) + 4 + length], parse_constant=reject)
+    if header["best"] is not None or header["drivers"]["VER"]["time"] is not None:
+        return "NaN не заменен на null"
+    return None
+
+
+def check_lap_distance(year, event): # дистанция LapTrace против get_car_data().add_distance() лучшего круга, как в исходных графиках
+    import numpy as np
+    from session_store import FULL, TELEMETRY, load_compact, load_session
+
+    compact = load_compact(year, event, "R", TELEMETRY)
+    session = load_session(year, event, "R", FULL)
+    if not compact.traces:
+        return "нет телеметрии"
+    error = 0.0
+    for driver, trace in compact.traces.items():
+        car = session.laps.pick_drivers(driver).pick_fastest().get_car_data().add_distance()
+        if len(car) != len(trace.distance):
+            return f"{driver}: {len(trace.distance)} точек вместо {len(car)}"
+        error = max(error, np.abs(car["Distance"].to_numpy() - trace.distance).max())
+    return None if error < 0.01 else f"отклонение {error:.3g} м" # float32 на круге в 5 км
+
+
+def baseline_track_rating(track_results): # исходный расчет рейтинга трассы циклом по результатам, как до track_rating.py
+    import numpy as np
+
+    driver_stats = {}
+    for _, result in track_results.sort_values("Year", kind="stable").iterrows():
+        stats = driver_stats.setdefault(result["Driver"], {"total_points": 0, "races_count": 0, "best_position": 99, "positions": []})
+        stats["total_points"] += result["Points"]
+        stats["races_count"] += 1
+        stats["positions"].append(result["Position"])
+        stats["best_position"] = min(stats["best_position"], result["Position"])
+
+    ratings = []
+    for driver, stats in driver_stats.items():
+        avg_points = stats["total_points"] / stats["races_count"]
+        position_bonus = (20 - stats["best_position"]) * 0.5
+        consistency_bonus = min(5, 10 / np.std(stats["positions"]) if len(stats["positions"]) > 1 else 0)
+        ratings.append((driver, round(avg_points + position_bonus + consistency_bonus, 1)))
+    return sorted(ratings, key=lambda x: x[1], reverse=True)
+
+
+def check_rate_tracks(year): # rate_tracks по всем трассам против исходного цикла, с неклассифицированными результатами
+    import numpy as np
+    from results_store import results_store
+    from track_rating import LOOKBACK_YEARS, first_race_per_year, rate_tracks
+
+    results = results_store.frame(range(year - LOOKBACK_YEARS, year)).copy()
+    if results.empty:
+        return "нет результатов"
+    results.loc[results.index[::7], "Position"] = np.nan # сход без классификации
+    results.loc[results["Driver"] == results["Driver"].iloc[0], "Position"] = np.nan # ни одного классифицированного результата
+    table = rate_tracks(results, year)
+    window = first_race_per_year(results)
+    problems = []
+    for circuit, track_results in window.groupby("Circuit", sort=False):
+        expected = baseline_track_rating(track_results)
+        rated = table[table["Circuit"] == circuit]
+        actual = list(zip(rated["Driver"], rated["rating"]))
+        if len(actual) != len(expected) or any(a[0] != e[0] or not np.isclose(a[1], e[1]) for a, e in zip(actual, expected)):
+            problems.append(circuit)
+    return f"расходятся трассы: {', '.join(problems)}" if problems else None
+
+
+def checks(year, event): # имя -> функция без аргументов, возвращает None или описание расхождения
+    return {
+        "lap_compare.resample_rows": check_resample_rows,
+        "session_data.get_stint_data[json]": lambda: check_stint_json(year, event),
+        "session_data.to_binary[header]": check_binary_header,
+        "compact_session.LapTrace[distance]": lambda: check_lap_distance(year, event),
+        "track_rating.rate_tracks": lambda: check_rate_tracks(year)
+    }
+
+
+def verify(year, event): # True, если все проверки прошли
+    ok = True
+    for name, check in checks(year, event).items():
+        try:
+            problem = check()
+        except Exception as e:
+            problem = f"ошибка {e}"
+        print(f"проверка {name:40} {'ок' if problem is None else problem}")
+        ok = ok and problem is None
+    return ok
+
+
+def cases(year, event): # имя -> функция без аргументов
+    import numpy as np
+    import analysis_utils
+    import plotting
+    import session_data
+
+    args = (year, event, "R")
+    drivers = ["VER", "LEC", "HAM"]
+    grid = [abbreviation for abbreviation, _ in synthetic.DRIVERS] # сравнение всех гонщиков должно стоить почти как двух
+
+    last_race, _ = analysis_utils.get_last_and_next_race()
+
+    figure = plotting.Figure(figsize=(10, 6)) # готовая фигура, чтобы мерить только кодирование
+    plotting.FigureCanvasAgg(figure)
+    x = np.linspace(0, 100, 2000)
+    figure.add_subplot().plot(x, np.sin(x))
+
+    return {
+        "plotting.create_pitstop_analysis": lambda: plotting.create_pitstop_analysis(year, event),
+        "plotting.create_track_performance_chart": lambda: plotting.create_track_performance_chart(event),
+        "plotting.create_lap_times_analysis": lambda: plotting.create_lap_times_analysis(year, event),
+        "plotting.create_lap_time_plot": lambda: plotting.create_lap_time_plot(*args, drivers),
+        "plotting.create_track_map_plot": lambda: plotting.create_track_map_plot(*args),
+        "plotting.create_gear_shifts_plot": lambda: plotting.create_gear_shifts_plot(*args),
+        "plotting.create_speed_visual_plot": lambda: plotting.create_speed_visual_plot(*args),
+        "plotting.create_mini_sector_plot": lambda: plotting.create_mini_sector_plot(*args),
+        "plotting.create_speed_trace_plot": lambda: plotting.create_speed_trace_plot(*args, drivers),
+        "plotting.create_speed_trace_plot[all]": lambda: plotting.create_speed_trace_plot(*args, grid),
+        "session_data.get_speed_data": lambda: session_data.get_speed_data(*args, drivers),
+        "session_data.get_speed_data[all]": lambda: session_data.get_speed_data(*args, grid),
+        "plotting.create_position_changes_plot": lambda: plotting.create_position_changes_plot(*args),
+        "plotting.create_stint_degradation_plot": lambda: plotting.create_stint_degradation_plot(*args),
+        "plotting.get_image_base64": lambda: plotting.get_image_base64(figure),
+        "analysis_utils.get_last_and_next_race": analysis_utils.get_last_and_next_race,
+        "analysis_utils.get_available_seasons": analysis_utils.get_available_seasons,
+        "analysis_utils.get_events_for_season": lambda: analysis_utils.get_events_for_season(year),
+        "analysis_utils.get_drivers_for_session": lambda: analysis_utils.get_drivers_for_session(*args),
+        "analysis_utils.is_session_completed": lambda: analysis_utils.is_session_completed(*args),
+        "analysis_utils.get_session_types": analysis_utils.get_session_types,
+        "analysis_utils.get_current_form": analysis_utils.get_current_form,
+        "analysis_utils.get_track_results": lambda: analysis_utils.get_track_results(event, range(year - 3, year)),
+        "analysis_utils.get_driver_track_rating": lambda: analysis_utils.get_driver_track_rating(event),
+        "analysis_utils.get_calendar_ratings": analysis_utils.get_calendar_ratings,
+        "analysis_utils.get_session_results": lambda: analysis_utils.get_session_results(*args),
+        "analysis_utils.get_stint_summary": lambda: analysis_utils.get_stint_summary(*args),
+        "analysis_utils.get_last_race_winner": lambda: analysis_utils.get_last_race_winner(last_race)
+    }
+
+
+def measure(func, repeat): # время по repeat запускам, память отдельным запуском под tracemalloc, он сам замедляет код
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks_before # что осталось в памяти после вызова: кеши, утечки
+
+    return {
+        "median_s": round(statistics.median(timings), 6),
+        "min_s": round(min(timings), 6),
+        "runs": repeat,
+        "peak_kb": round(peak / 1024, 1),
+        "retained_blocks": blocks,
+        "ok": result is not None and result is not False
+    }
+
+
+def compare(results, baseline, threshold): # функции, у которых медиана выросла больше чем на threshold
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        old, new = previous["median_s"], current["median_s"]
+        if new > old * (1 + threshold) and new - old > NOISE_FLOOR:
+            regressions.append((name, old, new))
+    return regressions
+
+
+def run(repeat, warmup, name_filter, seasons, n_laps):
+    year, event = synthetic.install(seasons=seasons, n_laps=n_laps)
+    if not verify(year, event):
+        return None
+    benchmarks = {name: func for name, func in cases(year, event).items() if name_filter in name}
+
+    results = {}
+    for name, func in benchmarks.items():
+        for _ in range(warmup): # первый вызов строит индексы и таблицы результатов, его в замер не берем
+            func()
+        results[name] = measure(func, repeat)
+        r = results[name]
+        print(f"{name:50} {r['median_s'] * 1000:9.1f} мс  пик {r['peak_kb']:9.0f} КБ  блоков {r['retained_blocks']:6}"
+              f"{'' if r['ok'] else '  (ошибка)'}")
+    return results
+
+
+def environment():
+    import fastf1
+    import matplotlib
+    import numpy
+    import pandas
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fastf1": fastf1.__version__,
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "matplotlib": matplotlib.__version__
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки функций анализа и графиков на синтетических данных")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--filter", default="", help="подстрока имени функции")
+    parser.add_argument("--seasons", type=int, default=3, help="сколько прошедших сезонов синтетических результатов")
+    parser.add_argument("--laps", type=int, default=57, help="кругов в синтетической гонке")
+    parser.add_argument("--output", help="куда записать JSON с результатами")
+    parser.add_argument("--baseline", help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление, доля")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.warmup, args.filter, args.seasons, args.laps)
+    if results is None:
+        print("Проверки не прошли, замер не выполнялся")
+        sys.exit(1)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {"repeat": args.repeat, "warmup": args.warmup, "seasons": args.seasons, "laps": args.laps},
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"Замедление {name}: {old * 1000:.1f} мс -> {new * 1000:.1f} мс")
+        if regressions:
+            sys.exit(1)
+        print(f"Замедлений больше {args.threshold:.0%} нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Синтетические сессии в формате fastf1 для бенчмарков без сети: расписание, результаты, круги и телеметрия.
+# install() подменяет расписание fastf1 и кладет сессии в session_store, после этого analysis_utils и plotting
+# работают как с настоящими данными.
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import fastf1 as ff1
+import fastf1._api
+import fastf1.core as core
+import fastf1.events as events
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import FULL, RESULTS, session_store
+from startup import init
+
+
+TEAMS = [
+    ("Red Bull Racing", "3671C6", ["VER", "PER"]),
+    ("Ferrari", "E8002D", ["LEC", "SAI"]),
+    ("Mercedes", "27F4D2", ["HAM", "RUS"]),
+    ("McLaren", "FF8000", ["NOR", "PIA"]),
+    ("Aston Martin", "229971", ["ALO", "STR"]),
+    ("Alpine", "FF87BC", ["GAS", "OCO"]),
+    ("Williams", "64C4FF", ["ALB", "SAR"]),
+    ("RB", "6692FF", ["TSU", "RIC"]),
+    ("Kick Sauber", "52E252", ["BOT", "ZHO"]),
+    ("Haas F1 Team", "B6BABD", ["HUL", "MAG"])
+]
+DRIVERS = [(abbreviation, team) for team, _, abbreviations in TEAMS for abbreviation in abbreviations]
+POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+CIRCUITS = [
+    ("Bahrain Grand Prix", "Sakhir", "Bahrain"),
+    ("Saudi Arabian Grand Prix", "Jeddah", "Saudi Arabia"),
+    ("Australian Grand Prix", "Melbourne", "Australia"),
+    ("Monaco Grand Prix", "Monaco", "Monaco"),
+    ("Italian Grand Prix", "Monza", "Italy"),
+    ("Abu Dhabi Grand Prix", "Yas Marina", "United Arab Emirates")
+]
+
+CAR_HZ = 4.0 # car_data fastf1 приходит примерно раз в 240 мс
+POS_HZ = 4.0 # pos_data примерно раз в 220-280 мс
+BASE_LAP = 80.0 # секунд
+PIT_LAPS = (18, 36)
+
+
+def event_dates(year): # прошедшие сезоны целиком в прошлом, в текущем последняя гонка еще впереди
+    now = pd.Timestamp(datetime.now()).normalize()
+    if year < now.year:
+        return [pd.Timestamp(year, 3, 1) + pd.Timedelta(days=35 * i) for i in range(len(CIRCUITS))]
+    return [now - pd.Timedelta(days=14 * (len(CIRCUITS) - 2 - i) + 2) for i in range(len(CIRCUITS) - 1)] + [now + pd.Timedelta(days=14)]
+
+
+def make_schedule(year):
+    rows = []
+    for round_number, ((name, location, country), date) in enumerate(zip(CIRCUITS, event_dates(year)), 1):
+        row = {"RoundNumber": round_number, "Country": country, "Location": location, "OfficialEventName": name,
+               "EventDate": date, "EventName": name, "EventFormat": "conventional", "F1ApiSupport": True}
+        for number, session_name in enumerate(("Practice 1", "Practice 2", "Practice 3", "Qualifying", "Race"), 1):
+            session_date = date - pd.Timedelta(days=5 - number) + pd.Timedelta(hours=13)
+            row.update({f"Session{number}": session_name, f"Session{number}Date": session_date, f"Session{number}DateUtc": session_date})
+        rows.append(row)
+    return events.EventSchedule(pd.DataFrame(rows), year=year)
+
+
+def make_results(rng): # случайный финишный порядок
+    order = rng.permutation(len(DRIVERS))
+    rows = []
+    for position, index in enumerate(order, 1):
+        abbreviation, team = DRIVERS[index]
+        rows.append({
+            "DriverNumber": str(index + 1), "Abbreviation": abbreviation, "FullName": f"{abbreviation} Driver", "TeamName": team,
+            "Position": float(position), "ClassifiedPosition": str(position), "GridPosition": float(rng.integers(1, 21)),
+            "Points": float(POINTS[position - 1] if position <= len(POINTS) else 0), "Status": "Finished",
+            "Time": pd.Timedelta(seconds=position * 1.7 + 0.123)
+        })
+    return core.SessionResults(pd.DataFrame(rows).set_index("DriverNumber", drop=False), _force_default_cols=True)
+
+
+def track_shape(phase): # замкнутая трасса с поворотами разной кривизны, fastf1 X/Y в 1/10 м
+    return 5000 * np.cos(phase) + 300 * np.cos(3 * phase), 3000 * np.sin(phase) + 200 * np.sin(5 * phase)
+
+
+def make_session(schedule, round_number, seed=0, laps=True, n_laps=57, car_hz=CAR_HZ, pos_hz=POS_HZ):
+    rng = np.random.default_rng(seed)
+    event = schedule.get_event_by_round(round_number)
+    session = core.Session(event, "Race", f1_api_support=True)
+    session._results = make_results(rng)
+    session.get_circuit_info = lambda: SimpleNamespace(rotation=45.0, corners=pd.DataFrame())
+    if not laps:
+        return session
+
+    t0 = event["Session5DateUtc"]
+    lap_rows = []
+    car_data = {}
+    pos_data = {}
+    for index, (abbreviation, team) in enumerate(DRIVERS):
+        number = str(index + 1)
+        pace = rng.normal(0, 0.4)
+        start = pd.Timedelta(minutes=5)
+        for lap_number in range(1, n_laps + 1):
+            stint = sum(lap_number > pit for pit in PIT_LAPS)
+            tyre_life = lap_number - ([0] + list(PIT_LAPS))[stint]
+            seconds = BASE_LAP + pace + 0.04 * tyre_life + rng.normal(0, 0.3) + (20 if lap_number in PIT_LAPS else 0)
+            lap_time = pd.Timedelta(seconds=seconds)
+            lap_rows.append({
+                "Driver": abbreviation, "DriverNumber": number, "Team": team, "LapNumber": float(lap_number),
+                "LapTime": lap_time, "LapStartTime": start, "Time": start + lap_time, "LapStartDate": t0 + start,
+                "PitInTime": start + lap_time if lap_number in PIT_LAPS else pd.NaT,
+                "PitOutTime": start if lap_number - 1 in PIT_LAPS else pd.NaT,
+                "Position": float((index + lap_number // 10) % len(DRIVERS) + 1),
+                "Stint": float(stint + 1), "Compound": ("SOFT", "MEDIUM", "HARD")[stint], "TyreLife": float(tyre_life),
+                "FreshTyre": True, "IsAccurate": True, "Deleted": False, "IsPersonalBest": True, "TrackStatus": "1",
+                "Sector1Time": lap_time / 3, "Sector2Time": lap_time / 3, "Sector3Time": lap_time / 3,
+                "SpeedI1": np.nan, "SpeedI2": np.nan, "SpeedFL": np.nan, "SpeedST": np.nan
+            })
+            start += lap_time
+
+        car_time = pd.to_timedelta(np.arange(int(start.total_seconds() * car_hz)) / car_hz, unit="s")
+        phase = car_time.total_seconds().to_numpy() / BASE_LAP * 2 * np.pi
+        car_data[number] = core.Telemetry(pd.DataFrame({
+            "Date": t0 + car_time, "SessionTime": car_time, "Time": car_time,
+            "Speed": 200 + 100 * np.sin(3 * phase) + rng.normal(0, 2, len(phase)), "RPM": 11000.0,
+            "nGear": np.clip((5 + 3 * np.sin(3 * phase)).round(), 1, 8).astype(int),
+            "Throttle": 100.0, "Brake": False, "DRS": 0, "Source": "car"
+        }), session=session, driver=number)
+
+        pos_time = pd.to_timedelta(np.arange(int(start.total_seconds() * pos_hz)) / pos_hz, unit="s")
+        x, y = track_shape(pos_time.total_seconds().to_numpy() / BASE_LAP * 2 * np.pi)
+        pos_data[number] = core.Telemetry(pd.DataFrame({
+            "Date": t0 + pos_time, "SessionTime": pos_time, "Time": pos_time,
+            "X": x, "Y": y, "Z": 0.0, "Status": "OnTrack", "Source": "pos"
+        }), session=session, driver=number)
+
+    session._laps = core.Laps(pd.DataFrame(lap_rows), session=session, _force_default_cols=True)
+    session._car_data = car_data
+    session._pos_data = pos_data
+    session._t0_date = t0
+    session._session_start_time = pd.Timedelta(0)
+    session._weather_data = pd.DataFrame()
+    session._race_control_messages = pd.DataFrame()
+    return session
+
+
+def driver_info(*args, **kwargs): # вместо запроса к API: цвета команд для fastf1.plotting
+    info = {}
+    for index, (abbreviation, team) in enumerate(DRIVERS):
+        colour = next(colour for name, colour, _ in TEAMS if name == team)
+        info[str(index + 1)] = {"RacingNumber": str(index + 1), "Tla": abbreviation, "TeamName": team, "TeamColour": colour,
+                                "FirstName": abbreviation, "LastName": "Driver"}
+    return info
+
+
+def install(seasons=3, n_laps=57, car_hz=CAR_HZ, pos_hz=POS_HZ): # синтетический мир: seasons прошедших сезонов + текущий
+    init() # как в приложении: кеш fastf1 и стиль графиков
+    current_year = datetime.now().year
+    years = range(current_year - seasons, current_year + 1)
+    schedules = {year: make_schedule(year) for year in years}
+    empty = events.EventSchedule(pd.DataFrame(columns=list(events.EventSchedule._COLUMNS)), year=0)
+    ff1.get_event_schedule = lambda year, *args, **kwargs: schedules.get(year, empty)
+    fastf1._api.driver_info = driver_info
+
+    # производные таблицы результатов пишутся во временную папку, настоящий cache/ не трогаем
+    import results_store
+    results_store.results_store.path = tempfile.mkdtemp(prefix="f1-bench-results-")
+    import plot_cache
+    plot_cache.plot_cache.enabled = False # замеряем рендер, а не чтение PNG с диска
+    import shared_cache
+    shared_cache.shared_cache.enabled = False # и расчет, а не готовый результат другого процесса
+
+    target = None
+    for year, schedule in schedules.items():
+        for round_number, date in enumerate(event_dates(year), 1):
+            if date > pd.Timestamp(datetime.now()):
+                continue
+            # полные данные только у последней прошедшей гонки, остальным хватает результатов
+            is_target = year == current_year and round_number == len(CIRCUITS) - 1
+            session = make_session(schedule, round_number, seed=year * 100 + round_number, laps=is_target,
+                                   n_laps=n_laps, car_hz=car_hz, pos_hz=pos_hz)
+            name = schedule.get_event_by_round(round_number)["EventName"]
+            session_store.put(year, name, "R", session, FULL if is_target else RESULTS)
+            if is_target:
+                target = (year, name)
+    return target
@@ -0,0 +1,73 @@
+# Сравнение карт трассы с упрощением линии и без него: число отрезков и время рендера.
+#
+#   python -m benchmarks.track_simplify --year 2024 --event "Italian Grand Prix" --session Q --repeat 5
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotting
+import track_geometry
+from session_store import TELEMETRY, load_compact
+from startup import init
+from track_geometry import TRACK_TOLERANCE, simplify_track, speed_bins
+
+
+def segment_counts(compact, tolerance): # сколько отрезков получает LineCollection на карте передач и карте скорости
+    trace = compact.traces[compact.fastest_driver]
+    points = np.column_stack([trace.x, trace.y]).astype(np.float64)
+    gear = simplify_track(points, trace.gear.astype(float), tolerance=tolerance)
+    speed = simplify_track(points, speed_bins(trace.speed.astype(np.float64)), tolerance=tolerance)
+    return {"gear_shifts": len(gear) - 1, "speed_map": len(speed) - 1}
+
+
+def render_time(func, args, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args, use_cache=False)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def run(year, event, session_type, tolerance, repeat):
+    compact = load_compact(year, event, session_type, TELEMETRY)
+    jobs = {
+        "track_map": plotting.create_track_map_plot.png,
+        "gear_shifts": plotting.create_gear_shifts_plot.png,
+        "speed_map": plotting.create_speed_visual_plot.png
+    }
+
+    report = {}
+    for label, value in (("без упрощения", 0), (f"допуск {tolerance:g}", tolerance)):
+        track_geometry.TRACK_TOLERANCE = value
+        counts = segment_counts(compact, value)
+        times = {name: render_time(func, (year, event, session_type), repeat) for name, func in jobs.items()}
+        report[label] = (counts, times)
+
+    for label, (counts, times) in report.items():
+        print(f"{label}:")
+        for name, seconds in times.items():
+            segments = f", отрезков {counts[name]}" if name in counts else ""
+            print(f"  {name}: {seconds * 1000:.0f} мс{segments}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Рендер карт трассы с упрощением линии и без него")
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--event", default="Italian Grand Prix")
+    parser.add_argument("--session", default="R")
+    parser.add_argument("--tolerance", type=float, default=TRACK_TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    init()
+    run(args.year, args.event, args.session, args.tolerance, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+import fastf1 as ff1
+
+from metrics import report_error
+
+
+FIRST_SEASON = 2018
+SCHEDULE_TTL = 6 * 60 * 60 # расписание текущего сезона перечитываем раз в 6 часов, прошлые сезоны не меняются
+
+# одна и та же трасса в расписаниях fastf1 иногда записана по-разному
+LOCATION_ALIASES = {
+    "yas_island": "yas_marina",
+    "losail": "lusail",
+    "monte_carlo": "monaco",
+    "marina_bay": "singapore",
+    "montmelo": "barcelona",
+    "spa": "spa_francorchamps",
+}
+
+
+def normalize_name(name): # "Montréal" -> "montreal", "Spa-Francorchamps" -> "spa_francorchamps"
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def circuit_key(location, country=""): # канонический ключ трассы по месту проведения, а не по названию гран-при
+    key = normalize_name(location) or normalize_name(country)
+    return LOCATION_ALIASES.get(key, key)
+
+
+class CircuitIndex: # все гонки всех сезонов с 2018 года, сгруппированные по трассам
+    def __init__(self, first_season=FIRST_SEASON, ttl=SCHEDULE_TTL):
+        self.first_season = first_season
+        self.ttl = ttl
+        self._schedules = {} # год -> расписание
+        self._events = {} # ключ трассы -> [(год, EventName, RoundNumber)]
+        self._names = {} # нормализованное название гран-при или места -> ключ трассы
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def _ensure_fresh(self):
+        if self._built_at and time.time() - self._built_at < self.ttl:
+            return
+        with self._lock:
+            if self._built_at and time.time() - self._built_at < self.ttl:
+                return
+            self._rebuild()
+
+    def _rebuild(self):
+        current_year = datetime.now().year
+        for year in range(self.first_season, current_year + 1):
+            if year in self._schedules and year < current_year:
+                continue # прошедшие сезоны уже не поменяются
+            try:
+                self._schedules[year] = ff1.get_event_schedule(year)
+            except Exception as e:
+                report_error("circuit_index", f"Ошибка ff1 получения расписания {year}: {e}")
+
+        events = {}
+        names = {}
+        for year in sorted(self._schedules):
+            schedule = self._schedules[year]
+            for _, event in schedule[schedule["RoundNumber"] > 0].iterrows():
+                key = circuit_key(event["Location"], event["Country"])
+                events.setdefault(key, []).append((year, event["EventName"], int(event["RoundNumber"])))
+                names[key] = key
+                names[normalize_name(event["Location"])] = key
+                names[normalize_name(event["EventName"])] = key # более поздний сезон перезаписывает старое место проведения
+
+        self._events = events
+        self._names = names
+        if current_year in self._schedules: # без текущего сезона попробуем еще раз при следующем обращении
+            self._built_at = time.time()
+
+    def resolve(self, track_name): # название гран-при или места -> ключ трассы
+        self._ensure_fresh()
+        name = normalize_name(track_name)
+        key = self._names.get(name)
+        if key is None:
+            # запасной вариант для неполных названий вроде "Monaco"
+            key = next((k for n, k in self._names.items() if name and name in n), None)
+            if key is not None:
+                self._names[name] = key
+        return key
+
+    def events(self, track_name, years=None): # первая гонка на трассе в каждом году: [(год, EventName, RoundNumber)]
+        key = self.resolve(track_name)
+        if key is None:
+            return []
+        first_per_year = {}
+        for year, event_name, round_number in self._events.get(key, []):
+            if years is None or year in years:
+                first_per_year.setdefault(year, (year, event_name, round_number))
+        return [first_per_year[year] for year in sorted(first_per_year)]
+
+    def schedule(self, year): # расписание сезона из того же кеша, что и индекс
+        self._ensure_fresh()
+        if year not in self._schedules:
+            self._schedules[year] = ff1.get_event_schedule(year)
+        return self._schedules[year]
+
+    def all_events(self): # ключ трассы -> все гонки на ней
+        self._ensure_fresh()
+        return dict(self._events)
+
+
+circuit_index = CircuitIndex()
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import fastf1.plotting
+
+from lap_index import LapIndex
+from stint_model import QUICK_THRESHOLD
+
+
+# только то, что читают графики и данные страницы анализа, остальные колонки fastf1 не храним
+RESULT_COLUMNS = ("DriverNumber", "Abbreviation", "FullName", "TeamName", "Position", "GridPosition", "Points", "Status", "Time")
+CATEGORY_COLUMNS = ("Driver", "DriverNumber", "Team", "Compound") # строки кругов - коды категорий вместо объектов
+SESSION_TIME_COLUMNS = ("PitInTime", "PitOutTime") # графикам нужно только есть значение или нет, храним секунды float32
+FALLBACK_COLOR = "#808080" # если fastf1 не знает команду, гонщика или состав шин, график рисуется серым, а не падает
+
+
+def lap_slice(data, lap): # границы круга в массивах телеметрии по SessionTime и время от начала круга в секундах
+    session_time = data['SessionTime'].to_numpy()
+    first, last = np.searchsorted(session_time, [lap['LapStartTime'].to_timedelta64(), lap['Time'].to_timedelta64()])
+    return slice(first, last), (session_time[first:last] - lap['LapStartTime'].to_timedelta64()) / np.timedelta64(1, 's')
+
+
+def _compact_laps(laps): # круги с узкими типами: категории, int16, float32, время круга остается timedelta для осей графиков
+    frame = pd.DataFrame({column: laps[column].astype("category") for column in CATEGORY_COLUMNS})
+    frame["LapNumber"] = laps["LapNumber"].to_numpy().astype(np.int16)
+    frame["Position"] = laps["Position"].to_numpy().astype(np.float32) # NaN у кругов без позиции
+    frame["LapTime"] = laps["LapTime"].to_numpy()
+    for column in SESSION_TIME_COLUMNS:
+        frame[column] = (laps[column].dt.total_seconds()).to_numpy().astype(np.float32)
+    frame["IsPersonalBest"] = (laps["IsPersonalBest"] == True).to_numpy()
+    return frame
+
+
+def _colors(func, keys): # цвета fastf1 считаются по полной сессии, поэтому заранее; неизвестные пропускаем
+    colors = {}
+    for key in keys:
+        try:
+            colors[key] = func(key)
+        except Exception:
+            continue
+    return colors
+
+
+def quick_laps(laps, threshold=QUICK_THRESHOLD): # как Laps.pick_quicklaps: круги быстрее 107% лучшего
+    return laps[laps['LapTime'] < laps['LapTime'].min() * threshold]
+
+
+class LapTrace: # телеметрия одного круга: время от начала круга, дистанция, скорость, передача и координаты в точках car_data
+    __slots__ = ("time", "distance", "speed", "gear", "x", "y")
+
+    def __init__(self, car, pos, lap):
+        rows, time = lap_slice(car, lap) # срезом массивов, без копий DataFrame
+        speed = car['Speed'].to_numpy(dtype=np.float64)[rows]
+        pos_rows, pos_time = lap_slice(pos, lap)
+        self.time = time.astype(np.float32)
+        self.distance = np.cumsum(speed / 3.6 * np.diff(time, prepend=0.0)).astype(np.float32) # как get_car_data().add_distance(): fastf1 тоже берет первым шагом время первой точки от начала круга
+        self.speed = speed.astype(np.float32)
+        self.gear = car['nGear'].to_numpy()[rows].astype(np.int8)
+        # координаты пишутся со своей частотой, переводим на моменты car_data, как в Lap.get_telemetry
+        self.x, self.y = (np.interp(time, pos_time, pos[axis].to_numpy(dtype=np.float64)[pos_rows]).astype(np.float32)
+                          for axis in ('X', 'Y'))
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+
+class CompactSession: # то, что рисуют графики, без исходной телеметрии fastf1: сезон таких помещается в памяти воркера
+    __slots__ = ("parts", "location", "rotation", "results", "laps", "traces", "fastest_driver",
+                 "team_colors", "driver_styles", "compound_colors", "index", "source_bytes", "nbytes")
+
+    def __init__(self, session, parts, source_bytes=0):
+        self.parts = frozenset(parts) # какие части были загружены: laps, telemetry
+        self.source_bytes = source_bytes # сколько занимала исходная сессия, для отчета
+        self.location = session.event['Location']
+        results = session.results
+        self.results = results[[c for c in RESULT_COLUMNS if c in results.columns]].copy()
+        self.laps = _compact_laps(session.laps)
+        self.index = LapIndex(self) # срезы по гонщикам, лучший круг, пит-стопы и позиции
+
+        teams = set(self.laps['Team'].dropna()) | set(self.results['TeamName'].dropna())
+        self.team_colors = _colors(lambda team: fastf1.plotting.get_team_color(team, session=session), teams)
+        self.driver_styles = _colors(lambda abb: fastf1.plotting.get_driver_style(identifier=abb, style=['color', 'linestyle'], session=session),
+                                     self.results['Abbreviation'])
+        self.compound_colors = _colors(lambda compound: fastf1.plotting.get_compound_color(compound, session=session),
+                                       set(self.laps['Compound'].dropna()) | {"UNKNOWN"})
+
+        self.traces = {}
+        self.fastest_driver = None
+        self.rotation = None
+        if "telemetry" in self.parts:
+            best = None
+            source = LapIndex(session) # лучшие круги с исходными отметками времени для среза телеметрии
+            for driver in source.drivers:
+                lap = source.fastest(driver)
+                if lap is None or lap['DriverNumber'] not in session.car_data or lap['DriverNumber'] not in session.pos_data:
+                    continue
+                trace = LapTrace(session.car_data[lap['DriverNumber']], session.pos_data[lap['DriverNumber']], lap)
+                if len(trace.distance) < 2 or not trace.distance[-1] > 0:
+                    continue
+                self.traces[driver] = trace
+                if best is None or lap['LapTime'] < best: # как pick_fastest по всей сессии: при равенстве первый
+                    best, self.fastest_driver = lap['LapTime'], driver
+            try:
+                self.rotation = float(session.get_circuit_info().rotation)
+            except Exception:
+                self.rotation = None # без данных о трассе карты не рисуются
+
+        # после сборки не меняется, поэтому память считаем один раз: массивы и таблицы без мелких словарей
+        self.nbytes = (sum(int(frame.memory_usage(index=True, deep=True).sum()) for frame in (self.results, self.laps))
+                       + sum(trace.nbytes for trace in self.traces.values()))
+
+    def team_color(self, team):
+        return self.team_colors.get(team, FALLBACK_COLOR)
+
+    def driver_style(self, abb):
+        return self.driver_styles.get(abb) or {"color": FALLBACK_COLOR, "linestyle": "solid"}
+
+    def compound_color(self, compound):
+        return self.compound_colors.get(compound, FALLBACK_COLOR)
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+
+from metrics import report_error
+
+
+DASHBOARD_TTL = int(os.environ.get("F1_DASHBOARD_TTL", 15 * 60)) # через сколько секунд снимок главной считается устаревшим
+RACE_CHECK_INTERVAL = int(os.environ.get("F1_RACE_CHECK_INTERVAL", 5 * 60)) # как часто проверять, не завершилась ли новая гонка
+
+
+class DashboardSnapshot:
+    def __init__(self, context, built_at):
+        self.context = context
+        self.built_at = built_at
+
+    @property
+    def age(self): # возраст снимка в секундах
+        return time.time() - self.built_at
+
+
+class DashboardRefresher: # готовый контекст главной страницы, который пересобирается в фоне (stale-while-revalidate)
+    def __init__(self, build, race_key, ttl=DASHBOARD_TTL, check_interval=RACE_CHECK_INTERVAL):
+        self._build = build # собирает полный контекст index.html, в нем должен быть ключ "race_key"
+        self._race_key = race_key # быстрая проверка последней завершенной гонки
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._first_build = threading.Lock() # на холодном сервере все запросы ждут одну первую сборку
+        self._refreshing = False
+        self._watcher = None
+
+    def get(self): # отдает снимок сразу, устаревший обновляется асинхронно
+        self._start_watcher()
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._build_first() # первые запросы ждут сборку, дальше всегда отдаем готовое
+        elif snapshot.age > self.ttl:
+            self.refresh_async()
+        return snapshot
+
+    def _build_first(self): # ошибка первой сборки уходит вызывающему, следующий запрос попробует снова
+        with self._first_build:
+            if self._snapshot is None:
+                try:
+                    self._snapshot = DashboardSnapshot(self._build(), time.time())
+                except Exception as e:
+                    report_error("dashboard", f"Ошибка сборки главной страницы: {e}")
+                    raise
+            return self._snapshot
+
+    def refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        try:
+            self._snapshot = DashboardSnapshot(self._build(), time.time())
+        except Exception as e: # остается прежний снимок
+            report_error("dashboard", f"Ошибка обновления главной страницы: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+        threading.Thread(target=self.refresh, name="dashboard-refresh", daemon=True).start()
+
+    def _start_watcher(self):
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="dashboard-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self): # пересобираем снимок, как только появилась новая завершенная гонка
+        while True:
+            time.sleep(self.check_interval)
+            snapshot = self._snapshot
+            if snapshot is None:
+                continue
+            try:
+                if snapshot.age > self.ttl or self._race_key() != snapshot.context.get("race_key"):
+                    self.refresh()
+            except Exception as e:
+                report_error("dashboard", f"Ошибка проверки новой гонки: {e}")
+
+
+def format_age(seconds): # "5 мин назад" для шаблона
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "только что"
+    if minutes < 60:
+        return f"{minutes} мин назад"
+    return f"{minutes // 60} ч {minutes % 60} мин назад"
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from render_pool import render_pool
+from shared_cache import LOCK_TIMEOUT, shared_cache
+
+
+JOB_WORKERS = int(os.environ.get("F1_JOB_WORKERS", 4)) # сколько анализов считается одновременно, остальные ждут в очереди
+JOB_TTL = int(os.environ.get("F1_JOB_TTL", 5 * 60)) # сколько секунд держать готовый результат и отдавать его повторным запросам
+
+
+def job_id(key): # одинаковые параметры анализа - один id, страница результата знает его без запуска задачи
+    return hashlib.sha1(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def state_key(identifier): # состояние задачи в общем кеше, его видят все воркеры сервера
+    return f"job:{identifier}"
+
+
+def result_key(identifier, step):
+    return f"job:{identifier}:{step}"
+
+
+class AnalysisJob: # шаги одного анализа, результаты появляются по мере готовности
+    def __init__(self, key, steps, owner=None):
+        self.key = key
+        self.id = job_id(key)
+        self.steps = steps # {имя: (функция, аргументы)}, независимые друг от друга
+        self.owner = owner # владелец блокировки задачи в shared_cache
+        self.status = {name: "pending" for name in steps}
+        self.results = {}
+        self.finished_at = None
+        self.version = 0 # растет при каждом изменении
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def publish(self): # состояние в общий кеш: пока задача идет, запись живет не дольше блокировки, готовая - JOB_TTL
+        if not shared_cache.enabled:
+            return
+        snapshot = self.snapshot()
+        shared_cache.put(state_key(self.id), snapshot, JOB_TTL if snapshot["done"] else LOCK_TIMEOUT)
+
+    def _set(self, name, status, result=None):
+        if result is not None and shared_cache.enabled: # результат раньше статуса, чтобы другой воркер не увидел done без результата
+            shared_cache.put(result_key(self.id, name), result, JOB_TTL + LOCK_TIMEOUT)
+        with self._lock:
+            self.status[name] = status
+            if result is not None:
+                self.results[name] = result
+            self.version += 1
+        self.publish()
+
+    def run(self): # шаги рисуются параллельно в пуле рендера, сессию все берут из session_store, загружает ее первый
+        for name in self.steps:
+            self._set(name, "running")
+        for name, result in render_pool.completed(self.steps):
+            if result is None or result is False: # create_* и get_* при ошибке сами возвращают None или False
+                self._set(name, "error")
+            else:
+                self._set(name, "done", result)
+        with self._lock:
+            self.finished_at = time.time()
+            self.version += 1
+        self.publish()
+
+    def snapshot(self):
+        with self._lock:
+            return {"id": self.id, "key": self.key, "done": self.done, "version": self.version, "steps": dict(self.status)}
+
+
+class JobQueue: # задачи анализа в ограниченном пуле, одинаковые запросы объединяются в одну задачу
+    # задачу считает один воркер сервера под блокировкой в shared_cache, состояние и результаты шагов тоже лежат там,
+    # поэтому опрос и результаты отдает любой воркер; свои задачи воркер еще и держит в памяти
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+        self._jobs = {} # id -> задача этого воркера
+        self.submitted = 0
+        self.merged = 0
+
+    def submit(self, key, steps): # id уже идущей или готовой задачи с тем же ключом либо новой
+        identifier = job_id(key)
+        with self._lock:
+            self._expire()
+            known = identifier in self._jobs or (shared_cache.enabled and shared_cache.get(state_key(identifier)) is not None)
+            owner = None if known else shared_cache.try_lock(state_key(identifier))
+            if owner is None: # задача уже есть или другой воркер как раз ее ставит
+                self.merged += 1
+                return identifier
+            job = AnalysisJob(key, steps, owner)
+            self._jobs[identifier] = job
+            self.submitted += 1
+        job.publish() # pending сразу виден всем воркерам
+        self._executor.submit(self._run, job)
+        return identifier
+
+    def _run(self, job):
+        try:
+            job.run()
+        finally:
+            shared_cache.unlock(state_key(job.id), job.owner)
+
+    def _local(self, identifier):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(identifier)
+
+    def status(self, identifier): # снимок состояния или None, если задачи нет ни у этого воркера, ни в общем кеше
+        job = self._local(identifier)
+        if job is not None:
+            return job.snapshot()
+        return shared_cache.get(state_key(identifier)) if shared_cache.enabled else None
+
+    def result(self, identifier, step): # результат готового шага или None
+        job = self._local(identifier)
+        if job is not None:
+            return job.results.get(step)
+        return shared_cache.get(result_key(identifier, step)) if shared_cache.enabled else None
+
+    def _expire(self): # готовые задачи старше ttl больше не отдаем, следующий запрос посчитает заново
+        now = time.time()
+        for identifier in [i for i, job in self._jobs.items() if job.done and now - job.finished_at > self.ttl]:
+            del self._jobs[identifier]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "merged": self.merged,
+                "running": sum(1 for job in self._jobs.values() if not job.done),
+                "kept": len(self._jobs)
+            }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+GRID_POINTS = 1000 # точек общей сетки дистанции, шаг около 5 м на трассе средней длины
+MINI_SECTORS = 25
+
+
+def resample_rows(positions, channels, grid): # все строки на общую сетку одним np.interp
+    # позиции каждой строки нормированы в [0, 1], строку i сдвигаем на 2*i, чтобы отрезки не пересекались,
+    # и одним вызовом находим дробный индекс каждой точки сетки, дальше каналы берутся линейной интерполяцией по нему
+    count = len(positions)
+    offsets = 2.0 * np.arange(count)
+    xp = np.concatenate(positions) + np.repeat(offsets, [len(p) for p in positions])
+    # сетка каждой строки обрезается по ее первой и последней точке, как делает np.interp по одной строке,
+    # иначе точки сетки до начала строки интерполировались бы между концом предыдущей строки и началом этой
+    first = np.array([p[0] for p in positions], dtype=np.float64)
+    last = np.array([p[-1] for p in positions], dtype=np.float64)
+    x = np.clip(grid[None, :], first[:, None], last[:, None]) + offsets[:, None]
+    index = np.interp(x.ravel(), xp, np.arange(len(xp), dtype=np.float64))
+
+    lower = np.minimum(index.astype(np.int64), len(xp) - 2)
+    weight = index - lower
+    return [((1 - weight) * values[lower] + weight * values[lower + 1]).reshape(count, len(grid))
+            for values in (np.concatenate(rows) for rows in channels)]
+
+
+def compare_fastest_laps(compact, drivers, reference=None, points=GRID_POINTS): # самые быстрые круги на общей сетке дистанции, compact - CompactSession с телеметрией
+    codes, colors, lap_times, lengths, positions, speeds, times = [], [], [], [], [], [], []
+    for driver in drivers:
+        trace = compact.traces.get(driver)
+        if trace is None:
+            continue
+        lap = compact.index.fastest(driver)
+        distance = trace.distance.astype(np.float64)
+        codes.append(driver)
+        colors.append(compact.team_color(lap['Team']))
+        lap_times.append(lap['LapTime'].total_seconds())
+        lengths.append(distance[-1])
+        positions.append(distance / distance[-1]) # доля круга, у гонщиков длина круга по телеметрии немного разная
+        speeds.append(trace.speed.astype(np.float64))
+        times.append(trace.time.astype(np.float64))
+    if not codes:
+        return None
+
+    # опорный гонщик - выбранный или самый быстрый из выбранных, от него считается отставание
+    ref = codes.index(reference) if reference in codes else int(np.nanargmin(lap_times))
+    grid = np.linspace(0.0, 1.0, points)
+    speed, time = resample_rows(positions, (speeds, times), grid)
+    return {
+        "drivers": codes,
+        "colors": colors,
+        "reference": codes[ref],
+        "distance": (grid * lengths[ref]).astype(np.float32),
+        "speed": speed.astype(np.float32),
+        "delta": (time - time[ref]).astype(np.float32), # накопленное отставание в секундах, больше нуля - медленнее опорного
+        "time": time # время от начала круга в точках сетки
+    }
+
+
+def lap_outline(trace, grid): # координаты X, Y круга в точках сетки доли круга
+    fraction = trace.distance / trace.distance[-1]
+    return np.column_stack([np.interp(grid, fraction, axis) for axis in (trace.x, trace.y)])
+
+
+def mini_sectors(compact, count=MINI_SECTORS, points=GRID_POINTS): # время каждого гонщика в каждом мини-секторе и самый быстрый в секторе
+    comparison = compare_fastest_laps(compact, compact.index.drivers, points=points)
+    if comparison is None:
+        return None
+    bounds = np.linspace(0, points - 1, count + 1).round().astype(int) # границы секторов в точках сетки
+    times = np.diff(comparison["time"][:, bounds], axis=1) # гонщики × сектора, все сразу
+    fastest = times.argmin(axis=0)
+    drivers = comparison["drivers"]
+    return {
+        "drivers": drivers,
+        "teams": [compact.index.fastest(driver)['Team'] for driver in drivers],
+        "colors": comparison["colors"],
+        "reference": comparison["reference"],
+        "bounds": bounds,
+        "distance": comparison["distance"][bounds],
+        "times": times.astype(np.float32),
+        "fastest": fastest,
+        "outline": lap_outline(compact.traces[comparison["reference"]], np.linspace(0.0, 1.0, points))
+    }
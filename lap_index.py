@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+
+class LapIndex: # круги сессии по гонщикам: строится один раз, дальше доступ к гонщику без просмотра всей таблицы
+    def __init__(self, session):
+        laps = session.laps
+        drivers = laps['Driver'].to_numpy()
+        # fastf1 хранит круги гонщика подряд, тогда срезы берутся из самой таблицы без копии
+        if len(drivers) and np.count_nonzero(drivers[1:] != drivers[:-1]) + 1 != len(pd.unique(drivers)):
+            laps = laps.iloc[np.argsort(drivers, kind="stable")]
+            drivers = laps['Driver'].to_numpy()
+        self.laps = laps
+
+        rows = pd.DataFrame({"Driver": drivers, "row": np.arange(len(drivers))})
+        bounds = rows.groupby("Driver", sort=False)["row"].agg(["min", "max"])
+        self._slices = {driver: slice(start, stop + 1) for driver, start, stop in bounds.itertuples()}
+
+        # как pick_fastest: самый быстрый из засчитанных личных рекордов, при равенстве - первый
+        best = rows.assign(time=laps['LapTime'].to_numpy())[(laps['IsPersonalBest'] == True).to_numpy() & laps['LapTime'].notna().to_numpy()]
+        best = best.sort_values("time", kind="stable").drop_duplicates("Driver")
+        self._fastest = dict(zip(best["Driver"], best["row"]))
+
+        pit_rows = np.flatnonzero(laps['PitInTime'].notna().to_numpy())
+        self._pits = {driver: pit_rows[np.searchsorted(pit_rows, s.start):np.searchsorted(pit_rows, s.stop)]
+                      for driver, s in self._slices.items()}
+
+        results = session.results
+        self._positions = dict(zip(results['Abbreviation'], results['Position'])) if results is not None else {}
+
+    @property
+    def drivers(self): # в порядке строк таблицы кругов
+        return list(self._slices)
+
+    def driver_laps(self, driver): # все круги гонщика, как pick_drivers(driver)
+        return self.laps.iloc[self._slices.get(driver, slice(0, 0))]
+
+    def fastest(self, driver): # как pick_drivers(driver).pick_fastest(), None если засчитанных кругов нет
+        row = self._fastest.get(driver)
+        return None if row is None else self.laps.iloc[row]
+
+    def pit_laps(self, driver): # круги заезда в боксы
+        return self.laps.iloc[self._pits.get(driver, [])]
+
+    def position(self, driver): # финишная позиция по результатам сессии, None если гонщика нет
+        return self._positions.get(driver)
@@ -0,0 +1,139 @@
+import bisect
+import contextlib
+import threading
+import time
+from collections import defaultdict
+
+
+# границы корзин гистограмм в секундах, от попадания в кеш до холодной загрузки сессии
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram: # гистограмма в формате Prometheus, отдельный ряд на каждый набор меток
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._series = {} # метки -> [счетчики корзин, сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{format_labels(key, le=bound)} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(key, le='+Inf')} {count}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {total:.6f}")
+                lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+def format_labels(key, **extra):
+    labels = list(key) + list(extra.items())
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+stage_seconds = Histogram("f1_stage_seconds", "Время этапов обработки: загрузка сессии, обработка данных, рисование, PNG, шаблоны")
+request_seconds = Histogram("f1_request_seconds", "Полное время ответа по обработчикам Flask")
+errors_total = Counter("f1_errors_total", "Ошибки, перехваченные в функциях и фоновых компонентах и выведенные в лог")
+
+_local = threading.local() # этапы текущего запроса для Server-Timing и стек вложенных замеров потока
+
+
+@contextlib.contextmanager
+def timed(stage, **labels): # замер этапа, работает и как декоратор; вложенные этапы вычитаются, у каждого только собственное время
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed # родитель вычтет из себя полное время этого этапа
+        _store(stage, max(0.0, elapsed - children), labels)
+
+
+def observe(stage, seconds, **labels): # готовый замер, например загрузка сессии с меткой попадания в кеш
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1] += seconds
+    _store(stage, seconds, labels)
+
+
+def _store(stage, seconds, labels):
+    stage_seconds.observe(seconds, stage=stage, **labels)
+    stages = getattr(_local, "stages", None) # этап попадает в Server-Timing, если выполнялся в потоке запроса
+    if stages is not None:
+        name = "_".join([stage, *(str(value) for value in labels.values())])
+        total, count = stages.get(name, (0.0, 0))
+        stages[name] = (total + seconds, count + 1)
+
+
+def report_error(source, message): # вместо print: то же сообщение в лог и счетчик ошибок с меткой источника - функции или компонента
+    print(message)
+    errors_total.inc(source=source)
+
+
+def start_request():
+    _local.stages = {}
+    _local.request_started = time.perf_counter()
+
+
+def finish_request(endpoint): # Server-Timing для ответа, None если запрос не отслеживался
+    stages = getattr(_local, "stages", None)
+    if stages is None:
+        return None
+    total = time.perf_counter() - _local.request_started
+    _local.stages = None
+    request_seconds.observe(total, endpoint=endpoint or "unknown")
+
+    entries = [f"{name};dur={seconds * 1000:.1f}" + (f';desc="x{count}"' if count > 1 else "")
+               for name, (seconds, count) in stages.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def expose(): # текст для /metrics
+    lines = []
+    for metric in (request_seconds, stage_seconds, errors_total):
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
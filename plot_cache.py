@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from metrics import report_error
+
+
+PLOT_CACHE_DIR = os.path.join("cache", "plots") # рядом с кешем fastf1
+PLOT_CACHE_MB = int(os.environ.get("F1_PLOT_CACHE_MB", 512))
+PLOT_CACHE_ENABLED = os.environ.get("F1_PLOT_CACHE", "1") != "0" # F1_PLOT_CACHE=0 полностью отключает кеш
+
+
+def normalize_args(args): # аргументы графика в виде, пригодном для ключа
+    normalized = []
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            normalized.append([str(a) for a in arg])
+        elif hasattr(arg, "item"): # numpy числа
+            normalized.append(arg.item())
+        else:
+            normalized.append(arg)
+    return normalized
+
+
+class PlotCache: # готовые PNG на диске с LRU вытеснением по размеру
+    def __init__(self, path=PLOT_CACHE_DIR, max_bytes=PLOT_CACHE_MB * 1024 * 1024, enabled=PLOT_CACHE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._size = None # примерный общий размер, пересчитывается при вытеснении
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, name, args, version): # функция + нормализованные аргументы + версия кода рисования + версия fastf1
+        import fastf1 # к моменту рисования уже загружен, импорт модуля plot_cache его не тянет
+        raw = json.dumps([name, normalize_args(args), version, fastf1.__version__], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.png")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        file_path = self._file(key)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            os.utime(file_path) # время изменения служит отметкой последнего использования
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if not self.enabled:
+            return
+        file_path = self._file(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # пишем во временный файл и атомарно переименовываем, чтобы параллельные воркеры не видели половину PNG
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except OSError as e:
+            report_error("plot_cache", f"Ошибка записи кеша графиков: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(".png"):
+                    file_path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, file_path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self): # удаляем давно не использованные файлы, пока не освободим четверть лимита
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.75
+        for _, size, file_path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(file_path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "enabled": self.enabled}
+
+
+plot_cache = PlotCache()
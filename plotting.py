@@ -1,78 +1,152 @@
 import matplotlib
 matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+from matplotlib.colors import Normalize
 from matplotlib import colormaps
 import numpy as np
-import fastf1 as ff1
-import fastf1.plotting
 import io
 import base64
+import contextlib
+import functools
 from datetime import datetime
-from analysis_utils import get_driver_track_rating, get_current_form
+from analysis_utils import get_driver_track_rating, get_current_form, is_session_completed
+from session_store import RESULTS, TELEMETRY, load_compact, load_session
+from circuit_index import circuit_index
+from plot_cache import plot_cache
+from shared_cache import LIVE_TTL, shared_cache
+from track_geometry import simplify_track, speed_bins
+from lap_compare import compare_fastest_laps, mini_sectors
+from stint_model import compound_summary, stint_table
+from compact_session import quick_laps
+from metrics import report_error, timed
+from startup import init
+
+
+RENDER_VERSION = 6 # увеличить при изменении кода рисования, чтобы старые PNG в кеше больше не использовались
+
+
+def session_of(args): # (год, гран-при, сессия) по аргументам create_*, у графиков главной сессия всегда гонка
+    return args[0], args[1], args[2] if len(args) > 2 else "R"
+
+
+def rendered_plot(func=None, *, cached=True, unordered_drivers=False, shared=False): # create_* рисуют PNG байты; вызов возвращает base64 для html, func.png(...) - сами байты
+    # shared - график главной страницы: пока на диск его не кладем, он общий для воркеров через shared_cache с коротким TTL
+    if func is None:
+        return functools.partial(rendered_plot, cached=cached, unordered_drivers=unordered_drivers, shared=shared)
+
+    @functools.wraps(func)
+    def png(*args, use_cache=True, **kwargs):
+        init() # стиль fastf1 и оси с timedelta, в том числе в процессах пула рендера
+        if unordered_drivers: # порядок выбранных гонщиков не важен, сортируем для одинакового ключа и картинки
+            args = args[:-1] + (sorted(args[-1]),)
+
+        def render():
+            with timed("processing", plot=func.__name__): # рисование и PNG внутри замеряются отдельными этапами
+                return func(*args, **kwargs)
+
+        key = plot_cache.key(func.__name__, list(args) + sorted(kwargs.items()), RENDER_VERSION)
+        # данные завершенной сессии уже не меняются, поэтому готовый PNG можно брать с диска
+        if not (cached and use_cache and plot_cache.enabled and is_session_completed(*session_of(args))):
+            if shared and use_cache:
+                return shared_cache.get_or_compute(key, render, LIVE_TTL)
+            return render()
+
+        image = plot_cache.get(key)
+        if image is None:
+            with shared_cache.lock(key): # рисует один воркер, остальные дождутся и возьмут файл
+                image = plot_cache.get(key)
+                if image is None:
+                    image = render()
+                    if isinstance(image, bytes):
+                        plot_cache.put(key, image)
+        return image
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        image = png(*args, **kwargs)
+        if isinstance(image, bytes):
+            return base64.b64encode(image).decode('utf-8')
+        return image # None или False при ошибке
+
+    png.__qualname__ = f"{func.__qualname__}.png" # чтобы png можно было передать в пул процессов
+    wrapper.png = png
+    return wrapper
+
+
+@contextlib.contextmanager
+def new_figure(**kwargs): # своя фигура на каждый вызов без глобального состояния pyplot, поэтому графики можно рисовать из разных потоков
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    try:
+        with timed("draw"):
+            yield fig
+    finally:
+        fig.clear() # сразу освобождаем оси и данные, не дожидаясь сборщика мусора
 
-fastf1.plotting.setup_mpl(mpl_timedelta_support=True)
-try:
-    ff1.Cache.enable_cache("cache")
-except:
-    pass
 
-def get_image_base64(): # превращает текущий график matplotlib в строку для html
+def get_image_png(fig): # превращает фигуру matplotlib в PNG байты
     img = io.BytesIO()
-    plt.savefig(img, format='png', bbox_inches='tight')
-    img.seek(0)
-    return base64.b64encode(img.getvalue()).decode('utf-8') # кодирую байты в строку base64
+    with timed("encode"):
+        fig.savefig(img, format='png', bbox_inches='tight')
+    return img.getvalue()
+
+
+def get_image_base64(fig): # превращает фигуру matplotlib в строку для html
+    return base64.b64encode(get_image_png(fig)).decode('utf-8') # кодирую байты в строку base64
 
 
+@rendered_plot(shared=True)
 def create_pitstop_analysis(year, event): # график анализа пит-стопов
     try:
-        session = ff1.get_session(year, event, "R")
-        session.load()
-        laps = session.laps
+        compact = load_compact(year, event, "R")
+        index = compact.index
+        laps = compact.laps
         
-        plt.figure(figsize=(14, 6))
-        
-        results = session.results
+        results = compact.results
         top_drivers = results["Abbreviation"].head(8).tolist()
         podium_drivers = results["Abbreviation"].head(3).tolist()
         
         all_drivers = list(set(top_drivers + podium_drivers))[:10]
         
-        for i, driver in enumerate(all_drivers):
-            driver_laps = laps[laps["Driver"] == driver]
-            pit_laps = driver_laps[driver_laps["PitInTime"].notna()]
-            
-            if not pit_laps.empty:
-                finish_pos = results[results["Abbreviation"] == driver]["Position"].iloc[0]
-                
-                marker_style = "D" if driver in podium_drivers else "o"
-                marker_size = 150 if driver in podium_drivers else 120
+        with new_figure(figsize=(14, 6)) as fig:
+            ax = fig.add_subplot()
+
+            for i, driver in enumerate(all_drivers):
+                pit_laps = index.pit_laps(driver)
                 
-                plt.scatter(pit_laps["LapNumber"], [driver] * len(pit_laps), 
-                           label=f"{driver} (P{finish_pos}){"*" if finish_pos <= 3 else ""}", 
-                           s=marker_size, alpha=0.8, edgecolors="black", linewidth=1,
-                           marker=marker_style)
-        
-        plt.title(f"Стратегии пит-стопов - {event} {year} (* = подиум, ромбы = призеры)", fontsize=14, fontweight="bold", pad=20)
-        plt.xlabel("Номер круга", fontsize=12)
-        plt.ylabel("Гонщик", fontsize=12)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
-        plt.grid(True, alpha=0.3)
-        
-        max_lap = laps["LapNumber"].max()
-        for lap in range(10, int(max_lap), 10):
-            plt.axvline(x=lap, color="gray", linestyle="--", alpha=0.2)
-        
-        plt.tight_layout()
-        image_data = get_image_base64()
-        plt.close() # очищаем память
-        return image_data
+                if not pit_laps.empty:
+                    finish_pos = index.position(driver)
+                    
+                    marker_style = "D" if driver in podium_drivers else "o"
+                    marker_size = 150 if driver in podium_drivers else 120
+                    
+                    ax.scatter(pit_laps["LapNumber"], [driver] * len(pit_laps), 
+                               label=f"{driver} (P{finish_pos}){"*" if finish_pos <= 3 else ""}", 
+                               s=marker_size, alpha=0.8, edgecolors="black", linewidth=1,
+                               marker=marker_style)
+            
+            ax.set_title(f"Стратегии пит-стопов - {event} {year} (* = подиум, ромбы = призеры)", fontsize=14, fontweight="bold", pad=20)
+            ax.set_xlabel("Номер круга", fontsize=12)
+            ax.set_ylabel("Гонщик", fontsize=12)
+            ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
+            ax.grid(True, alpha=0.3)
+            
+            max_lap = laps["LapNumber"].max()
+            for lap in range(10, int(max_lap), 10):
+                ax.axvline(x=lap, color="gray", linestyle="--", alpha=0.2)
+            
+            fig.tight_layout()
+            return get_image_png(fig)
     
     except Exception as e:
-        print(f"Ошибка создания графика пит-стопов: {e}")
+        report_error("create_pitstop_analysis", f"Ошибка создания графика пит-стопов: {e}")
         return False
 
 
+@rendered_plot(cached=False, shared=True) # зависит от текущей даты и новых гонок
 def create_track_performance_chart(track_name, top_drivers_count=6): # график производительности гонщиков на трассе
     try:
         current_year = datetime.now().year
@@ -84,14 +158,11 @@ def create_track_performance_chart(track_name, top_drivers_count=6): # граф
             top_drivers.add(driver["driver"])
         for driver in current_form[:4]:
             top_drivers.add(driver["driver"])
+        track_events = {year: event_name for year, event_name, _ in circuit_index.events(track_name, years)}
         for year in years[-2:]:
             try:
-                schedule = ff1.get_event_schedule(year)
-                track_events = schedule[schedule["EventName"].str.contains(track_name, case=False, na=False)]
-                if not track_events.empty:
-                    event = track_events.iloc[0]
-                    session = ff1.get_session(year, event.EventName, "R")
-                    session.load()
+                if year in track_events:
+                    session = load_session(year, track_events[year], "R", RESULTS)
                     podium_drivers = session.results["Abbreviation"].head(3).tolist()
                     for driver in podium_drivers:
                         top_drivers.add(driver)
@@ -103,12 +174,8 @@ def create_track_performance_chart(track_name, top_drivers_count=6): # граф
             positions = []
             for year in years:
                 try:
-                    schedule = ff1.get_event_schedule(year)
-                    track_events = schedule[schedule["EventName"].str.contains(track_name, case=False, na=False)]
-                    if not track_events.empty:
-                        event = track_events.iloc[0]
-                        session = ff1.get_session(year, event.EventName, "R")
-                        session.load()
+                    if year in track_events:
+                        session = load_session(year, track_events[year], "R", RESULTS)
                         driver_result = session.results[session.results["Abbreviation"] == driver]
                         if not driver_result.empty:
                             position = driver_result.iloc[0]["Position"]
@@ -132,112 +199,149 @@ def create_track_performance_chart(track_name, top_drivers_count=6): # граф
         driver_data = [d for d in driver_data if d["avg_position"] is not None]
         driver_data.sort(key=lambda x: x["avg_position"])
         
-        plt.figure(figsize=(14, 8))
-        
         drivers = [d["driver"] for d in driver_data]
         avg_positions = [d["avg_position"] for d in driver_data]
         
-        bars = plt.bar(drivers, avg_positions)
-        
-        for i, (bar, driver) in enumerate(zip(bars, drivers)): # красивая штука, zip объединяет в (bars, drivers) и потом enumerate проставляет индексы
-            was_podium = False
-            for data in driver_data:
-                if data["driver"] == driver:
-                    recent_positions = [p for p in data["positions"][-2:] if p is not None]
-                    if any(pos <= 3 for pos in recent_positions):
-                        was_podium = True
-                        break
-            if was_podium:
-                bar.set_edgecolor("gold")
-                bar.set_linewidth(3)
-        
-        plt.title(f"Средние позиции на трассе {track_name} (золотая рамка = был в топ-3 за последние 2 года)", fontsize=14, fontweight="bold")
-        plt.xlabel("Гонщик", fontsize=12)
-        plt.ylabel("Средняя позиция", fontsize=12)
+        with new_figure(figsize=(14, 8)) as fig:
+            ax = fig.add_subplot()
+            bars = ax.bar(drivers, avg_positions)
+            
+            for i, (bar, driver) in enumerate(zip(bars, drivers)): # красивая штука, zip объединяет в (bars, drivers) и потом enumerate проставляет индексы
+                was_podium = False
+                for data in driver_data:
+                    if data["driver"] == driver:
+                        recent_positions = [p for p in data["positions"][-2:] if p is not None]
+                        if any(pos <= 3 for pos in recent_positions):
+                            was_podium = True
+                            break
+                if was_podium:
+                    bar.set_edgecolor("gold")
+                    bar.set_linewidth(3)
+            
+            ax.set_title(f"Средние позиции на трассе {track_name} (золотая рамка = был в топ-3 за последние 2 года)", fontsize=14, fontweight="bold")
+            ax.set_xlabel("Гонщик", fontsize=12)
+            ax.set_ylabel("Средняя позиция", fontsize=12)
 
-        plt.gca().invert_yaxis()
-        plt.ylim(20, 0)
-        
-        plt.grid(True, alpha=0.3, axis="y")
-        plt.tight_layout()
-        
-        image_data = get_image_base64()
-        plt.close()
-        return image_data
+            ax.invert_yaxis()
+            ax.set_ylim(20, 0)
+            
+            ax.grid(True, alpha=0.3, axis="y")
+            fig.tight_layout()
+            
+            return get_image_png(fig)
         
     except Exception as e:
-        print(f"Ошибка создания графика производительности на трассе: {e}")
+        report_error("create_track_performance_chart", f"Ошибка создания графика производительности на трассе: {e}")
         return False
     
 
+@rendered_plot(shared=True)
 def create_lap_times_analysis(year, event): # график анализа времени кругов
     try:
-        session = ff1.get_session(year, event, "R")
-        session.load()
-        laps = session.laps
-        
-        plt.figure(figsize=(12, 8))
+        compact = load_compact(year, event, "R")
+        index = compact.index
         
-        results = session.results
+        results = compact.results
         top_drivers = results["Abbreviation"].head(6).tolist()
         podium_drivers = results["Abbreviation"].head(3).tolist()
         
         all_drivers = list(set(top_drivers + podium_drivers))[:8]
         
-        for i, driver in enumerate(all_drivers):
-            driver_laps = laps.pick_driver(driver)
-            if not driver_laps.empty:
-                finish_pos = results[results["Abbreviation"] == driver]["Position"].iloc[0]
+        with new_figure(figsize=(12, 8)) as fig:
+            ax = fig.add_subplot()
 
-                line_width = 3 if driver in podium_drivers else 1.5
-                line_style = "-" if driver in podium_drivers else "-"
+            for i, driver in enumerate(all_drivers):
+                driver_laps = index.driver_laps(driver)
+                if not driver_laps.empty:
+                    finish_pos = index.position(driver)
 
-                plt.plot(driver_laps["LapNumber"], driver_laps["LapTime"], "o-", label=f"{driver} (P{finish_pos}){"*" if finish_pos <= 3 else ""}", markersize=2, linewidth=line_width, alpha=0.8, linestyle=line_style)
-        
-        plt.title(f"Сравнение времени кругов - {event} {year} (* = подиум, толстые линии = призеры)", fontsize=14, fontweight="bold")
-        plt.xlabel("Номер круга", fontsize=12)
-        plt.ylabel("Время круга", fontsize=12)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        
-        image_data = get_image_base64()
-        plt.close()
-        return image_data
+                    line_width = 3 if driver in podium_drivers else 1.5
+                    line_style = "-" if driver in podium_drivers else "-"
+
+                    ax.plot(driver_laps["LapNumber"], driver_laps["LapTime"], "o-", label=f"{driver} (P{finish_pos}){"*" if finish_pos <= 3 else ""}", markersize=2, linewidth=line_width, alpha=0.8, linestyle=line_style)
+            
+            ax.set_title(f"Сравнение времени кругов - {event} {year} (* = подиум, толстые линии = призеры)", fontsize=14, fontweight="bold")
+            ax.set_xlabel("Номер круга", fontsize=12)
+            ax.set_ylabel("Время круга", fontsize=12)
+            ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
+            ax.grid(True, alpha=0.3)
+            fig.tight_layout()
+            
+            return get_image_png(fig)
     
     except Exception as e:
-        print(f"Ошибка создания графика времени кругов: {e}")
+        report_error("create_lap_times_analysis", f"Ошибка создания графика времени кругов: {e}")
         return False
 
 
+@rendered_plot
+def create_stint_degradation_plot(year, event_name, session_type="R"): # стинты всех гонщиков и деградация шин
+    try:
+        compact = load_compact(year, event_name, session_type)
+        table = stint_table(compact.index.laps, session_type)
+        if table.empty:
+            return None
+        summary = compound_summary(table)
+        drivers = [d for d in compact.results['Abbreviation'] if d in set(table['Driver'])] # сверху победитель
+        rows = {driver: len(drivers) - i for i, driver in enumerate(drivers)}
+
+        with new_figure(figsize=(14, 8)) as fig:
+            ax, summary_ax = fig.subplots(1, 2, gridspec_kw={"width_ratios": [3, 1]})
+
+            for stint in table.itertuples():
+                if stint.Driver not in rows:
+                    continue
+                color = compact.compound_color(stint.Compound)
+                ax.barh(rows[stint.Driver], stint.EndLap - stint.StartLap + 1, left=stint.StartLap - 0.5,
+                        color=color, edgecolor="black", linewidth=0.5)
+                if not np.isnan(stint.Degradation):
+                    ax.text((stint.StartLap + stint.EndLap) / 2, rows[stint.Driver], f"{stint.Degradation:+.2f}",
+                            ha="center", va="center", fontsize=7)
+
+            ax.set_yticks(list(rows.values()), list(rows.keys()))
+            ax.set_xlabel("Круг")
+            ax.set_title(f"Стинты и деградация (с/круг) - {event_name} {year}", fontsize=14, fontweight="bold")
+            ax.grid(True, alpha=0.3, axis="x")
+
+            colors = [compact.compound_color(c) for c in summary["Compound"]]
+            summary_ax.bar(summary["Compound"], summary["Degradation"], color=colors, edgecolor="black")
+            summary_ax.set_title("Средняя деградация", fontsize=12)
+            summary_ax.set_ylabel("с/круг")
+            summary_ax.grid(True, alpha=0.3, axis="y")
+            
+            fig.tight_layout()
+            return get_image_png(fig)
+    except Exception as e:
+        report_error("create_stint_degradation_plot", f"Ошибка создания графика стинтов: {e}")
+        return None
+
+
 ### Страница результатов анализа, perform_analysis ###
 
+@rendered_plot(unordered_drivers=True)
 def create_lap_time_plot(year, event_name, session_type, selected_drivers): # график времени круга
     try:
-        session = ff1.get_session(year, event_name, session_type)
-        session.load()
+        index = load_compact(year, event_name, session_type).index
         
-        plt.figure(figsize=(10, 6))
-        
-        for driver in selected_drivers:
-            laps = session.laps.pick_driver(driver)
-            if not laps.empty:
-                clean_laps = laps.pick_quicklaps()
-                plt.plot(clean_laps['LapNumber'], clean_laps['LapTime'], label=driver)
-        
-        plt.title(f"Анализ темпа: {event_name} {year}")
-        plt.xlabel("Круг")
-        plt.ylabel("Время")
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        
-        image_data = get_image_base64()
-        plt.close()
-        return image_data
+        with new_figure(figsize=(10, 6)) as fig:
+            ax = fig.add_subplot()
+
+            for driver in selected_drivers:
+                laps = index.driver_laps(driver)
+                if not laps.empty:
+                    clean_laps = quick_laps(laps)
+                    ax.plot(clean_laps['LapNumber'], clean_laps['LapTime'], label=driver)
+            
+            ax.set_title(f"Анализ темпа: {event_name} {year}")
+            ax.set_xlabel("Круг")
+            ax.set_ylabel("Время")
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+            
+            return get_image_png(fig)
         
     except Exception as e:
-        print(f"Ошибка построения графика: {e}")
-        plt.close()
+        report_error("create_lap_time_plot", f"Ошибка построения графика: {e}")
         return None
     
     
@@ -247,182 +351,224 @@ def rotate(xy, *, angle):
     return np.matmul(xy, rot_mat)
 
 
+@rendered_plot
 def create_track_map_plot(year, event_name, session_type): # карта трассы с поворотами
     try:
-        session = ff1.get_session(year, event_name, session_type)
-        session.load(laps=True, telemetry=True)
-        
-        lap = session.laps.pick_fastest()
-        pos = lap.get_pos_data()
-        circuit_info = session.get_circuit_info()
+        compact = load_compact(year, event_name, session_type, TELEMETRY)
+        trace = compact.traces[compact.fastest_driver]
 
-        track = pos.loc[:, ('X', 'Y')].to_numpy()
-        track_angle = circuit_info.rotation / 180 * np.pi
+        track = np.column_stack([trace.x, trace.y]).astype(np.float64)
+        track_angle = compact.rotation / 180 * np.pi
         rotated_track = rotate(track, angle=track_angle)
+        rotated_track = rotated_track[simplify_track(rotated_track)]
 
-        plt.figure(figsize=(10, 6))
-        plt.plot(rotated_track[:, 0], rotated_track[:, 1], color='black', lw=3)
+        with new_figure(figsize=(10, 6)) as fig:
+            ax = fig.add_subplot()
+            ax.plot(rotated_track[:, 0], rotated_track[:, 1], color='black', lw=3)
 
-        plt.title(f"Карта трассы: {session.event['Location']} ({year})", fontsize=15)
-        plt.axis('equal')
-        plt.xticks([])
-        plt.yticks([])
-        
-        return get_image_base64()
+            ax.set_title(f"Карта трассы: {compact.location} ({year})", fontsize=15)
+            ax.axis('equal')
+            ax.set_xticks([])
+            ax.set_yticks([])
+            
+            return get_image_png(fig)
     except Exception as e:
-        print(f"Ошибка при создании карты трассы: {e}")
+        report_error("create_track_map_plot", f"Ошибка при создании карты трассы: {e}")
         return None
     
 
+@rendered_plot
 def create_gear_shifts_plot(year, event_name, session_type): # график переключения передач
     try:
-        session = ff1.get_session(year, event_name, session_type)
-        session.load(laps=True, telemetry=True)
-        
-        lap = session.laps.pick_fastest()
-        tel = lap.get_telemetry()
-        circuit_info = session.get_circuit_info()
+        compact = load_compact(year, event_name, session_type, TELEMETRY)
+        trace = compact.traces[compact.fastest_driver]
 
-        x = np.array(tel['X'].values)
-        y = np.array(tel['Y'].values)
-        points = np.array([x, y]).T
+        points = np.column_stack([trace.x, trace.y]).astype(np.float64)
         
-        track_angle = circuit_info.rotation / 180 * np.pi
+        track_angle = compact.rotation / 180 * np.pi
         rotated_points = rotate(points, angle=track_angle)
+        gear = trace.gear.astype(float)
+
+        # почти все соседние отрезки лежат на одной прямой, оставляем только нужные для формы и смены передачи
+        keep = simplify_track(rotated_points, gear)
+        rotated_points, gear = rotated_points[keep], gear[keep]
         
         points_reshaped = rotated_points.reshape(-1, 1, 2)
         segments = np.concatenate([points_reshaped[:-1], points_reshaped[1:]], axis=1)
-        gear = tel['nGear'].to_numpy().astype(float)
 
         cmap = colormaps['Paired']
-        lc_comp = LineCollection(segments, norm=plt.Normalize(1, cmap.N+1), cmap=cmap)
+        lc_comp = LineCollection(segments, norm=Normalize(1, cmap.N+1), cmap=cmap)
         lc_comp.set_array(gear)
         lc_comp.set_linewidth(5)
 
-        plt.figure(figsize=(10, 6))
-        plt.gca().add_collection(lc_comp)
-        plt.axis('equal')
-        plt.tick_params(labelleft=False, left=False, labelbottom=False, bottom=False)
-        
-        plt.title(f"Переключение передач: {lap['Driver']} - {event_name} {year}", fontsize=15)
+        with new_figure(figsize=(10, 6)) as fig:
+            ax = fig.add_subplot()
+            ax.add_collection(lc_comp)
+            ax.axis('equal')
+            ax.tick_params(labelleft=False, left=False, labelbottom=False, bottom=False)
+            
+            ax.set_title(f"Переключение передач: {compact.fastest_driver} - {event_name} {year}", fontsize=15)
 
-        cbar = plt.colorbar(mappable=lc_comp, label="Передача", boundaries=np.arange(1, 10))
-        cbar.set_ticks(np.arange(1.5, 9.5))
-        cbar.set_ticklabels(np.arange(1, 9))
-        
-        return get_image_base64()
+            cbar = fig.colorbar(mappable=lc_comp, ax=ax, label="Передача", boundaries=np.arange(1, 10))
+            cbar.set_ticks(np.arange(1.5, 9.5))
+            cbar.set_ticklabels(np.arange(1, 9))
+            
+            return get_image_png(fig)
     except Exception as e:
-        print(f"Ошибка создания графика передач: {e}")
+        report_error("create_gear_shifts_plot", f"Ошибка создания графика передач: {e}")
         return None
     
 
+@rendered_plot
 def create_speed_visual_plot(year, event_name, session_type): # визуализация скорости на трассе
     try:
-        session = ff1.get_session(year, event_name, session_type)
-        session.load(laps=True, telemetry=True)
-        
-        lap = session.laps.pick_fastest()
-        tel = lap.get_telemetry()
-        circuit_info = session.get_circuit_info()
+        compact = load_compact(year, event_name, session_type, TELEMETRY)
+        trace = compact.traces[compact.fastest_driver]
 
-        x = tel['X'].to_numpy()
-        y = tel['Y'].to_numpy()
-        points = np.array([x, y]).T
+        points = np.column_stack([trace.x, trace.y]).astype(np.float64)
         
-        track_angle = circuit_info.rotation / 180 * np.pi
+        track_angle = compact.rotation / 180 * np.pi
         rotated_points = rotate(points, angle=track_angle)
         
-        speed = tel['Speed'].to_numpy()
+        speed = trace.speed.astype(np.float64)
+        norm = Normalize(speed.min(), speed.max())
+
+        keep = simplify_track(rotated_points, speed_bins(speed))
+        rotated_points, speed = rotated_points[keep], speed[keep]
         
         rotated_points_reshaped = rotated_points.reshape(-1, 1, 2)
         segments = np.concatenate([rotated_points_reshaped[:-1], rotated_points_reshaped[1:]], axis=1)
 
-        fig, ax = plt.subplots(figsize=(10, 6))
-        plt.subplots_adjust(left=0.05, right=0.95, top=0.9, bottom=0.15)
-        ax.axis('off')
+        with new_figure(figsize=(10, 6)) as fig:
+            ax = fig.add_subplot()
+            fig.subplots_adjust(left=0.05, right=0.95, top=0.9, bottom=0.15)
+            ax.axis('off')
 
-        ax.plot(rotated_points[:, 0], rotated_points[:, 1], color='black', lw=14, zorder=0)
+            ax.plot(rotated_points[:, 0], rotated_points[:, 1], color='black', lw=14, zorder=0)
 
-        norm = plt.Normalize(speed.min(), speed.max())
-        lc = LineCollection(segments, cmap='plasma', norm=norm, lw=6, zorder=1)
-        lc.set_array(speed)
-        ax.add_collection(lc)
-        ax.set_aspect('equal')
+            lc = LineCollection(segments, cmap='plasma', norm=norm, lw=6, zorder=1)
+            lc.set_array(speed)
+            ax.add_collection(lc)
+            ax.set_aspect('equal')
 
-        plt.title(f"Визуализация скорости: {lap['Driver']} - {event_name} {year}", fontsize=15, pad=20)
+            ax.set_title(f"Визуализация скорости: {compact.fastest_driver} - {event_name} {year}", fontsize=15, pad=20)
 
-        cbar_ax = fig.add_axes([0.25, 0.08, 0.5, 0.03])
-        plt.colorbar(lc, cax=cbar_ax, orientation='horizontal', label='Скорость (км/ч)')
-        
-        return get_image_base64()
+            cbar_ax = fig.add_axes([0.25, 0.08, 0.5, 0.03])
+            fig.colorbar(lc, cax=cbar_ax, orientation='horizontal', label='Скорость (км/ч)')
+            
+            return get_image_png(fig)
     except Exception as e:
-        print(f"Ошибка создания графика скорости: {e}")
+        report_error("create_speed_visual_plot", f"Ошибка создания графика скорости: {e}")
+        return None
+
+
+@rendered_plot
+def create_mini_sector_plot(year, event_name, session_type): # карта трассы: кто быстрее всех в каждом мини-секторе
+    try:
+        compact = load_compact(year, event_name, session_type, TELEMETRY)
+        sectors = mini_sectors(compact)
+        if sectors is None:
+            return None
+
+        track_angle = compact.rotation / 180 * np.pi
+        outline = rotate(sectors["outline"], angle=track_angle)
+        bounds, fastest = sectors["bounds"], sectors["fastest"]
+        segments = [outline[start:stop + 1] for start, stop in zip(bounds[:-1], bounds[1:])]
+        colors = [sectors["colors"][row] for row in fastest]
+
+        # цвет сектора - цвет команды, напарники одного цвета, поэтому легенда по командам
+        won = {}
+        for row in fastest:
+            team = sectors["teams"][row]
+            won[team] = won.get(team, 0) + 1
+        team_colors = dict(zip(sectors["teams"], sectors["colors"]))
+
+        with new_figure(figsize=(10, 6)) as fig:
+            ax = fig.add_subplot()
+            fig.subplots_adjust(left=0.05, right=0.75, top=0.9, bottom=0.05)
+            ax.axis('off')
+
+            ax.plot(outline[:, 0], outline[:, 1], color='black', lw=14, zorder=0)
+            ax.add_collection(LineCollection(segments, colors=colors, lw=6, zorder=1))
+            ax.set_aspect('equal')
+
+            handles = [Line2D([0], [0], color=team_colors[team], lw=6) for team in sorted(won, key=won.get, reverse=True)]
+            labels = [f"{team} ({won[team]})" for team in sorted(won, key=won.get, reverse=True)]
+            ax.legend(handles, labels, bbox_to_anchor=(1.02, 1), loc='upper left', title='Быстрейшие секторы')
+
+            ax.set_title(f"Мини-секторы ({len(segments)}): лучшие круги {len(sectors['drivers'])} гонщиков - {event_name} {year}", fontsize=15, pad=20)
+            
+            return get_image_png(fig)
+    except Exception as e:
+        report_error("create_mini_sector_plot", f"Ошибка создания карты мини-секторов: {e}")
         return None
     
 
+@rendered_plot(unordered_drivers=True)
 def create_speed_trace_plot(year, event_name, session_type, selected_drivers): # график скорости выбранных гонщиков
     try:
         if len(selected_drivers) < 2:
             return None
 
-        session = ff1.get_session(year, event_name, session_type)
-        session.load(laps=True, telemetry=True)
-        
-        plt.figure(figsize=(12, 5))
-        
-        drivers_to_compare = selected_drivers[:2]
+        comparison = compare_fastest_laps(load_compact(year, event_name, session_type, TELEMETRY), selected_drivers)
+        if comparison is None:
+            return None
+        drivers = comparison["drivers"]
         
-        for driver_code in drivers_to_compare:
-            lap = session.laps.pick_driver(driver_code).pick_fastest()
-            tel = lap.get_car_data().add_distance()
-            
-            team_color = fastf1.plotting.get_team_color(lap['Team'], session=session)
-            
-            plt.plot(tel['Distance'], tel['Speed'], color=team_color, label=driver_code, linewidth=2)
+        with new_figure(figsize=(12, 7)) as fig:
+            ax, delta_ax = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
 
-        plt.xlabel('Дистанция (метры)')
-        plt.ylabel('Скорость (км/ч)')
-        plt.legend()
-        plt.title(f"Сравнение скорости: {' vs '.join(drivers_to_compare)}\n{event_name} {year}")
-        plt.grid(True, alpha=0.3)
-        
-        return get_image_base64()
+            for driver_code, color, speed, delta in zip(drivers, comparison["colors"], comparison["speed"], comparison["delta"]):
+                ax.plot(comparison["distance"], speed, color=color, label=driver_code, linewidth=2 if len(drivers) <= 4 else 1)
+                delta_ax.plot(comparison["distance"], delta, color=color, linewidth=1.5)
+
+            ax.set_ylabel('Скорость (км/ч)')
+            ax.legend(ncol=1 if len(drivers) <= 10 else 2, fontsize='small')
+            names = ' vs '.join(drivers) if len(drivers) <= 4 else f"{len(drivers)} гонщиков"
+            ax.set_title(f"Сравнение скорости: {names}\n{event_name} {year}")
+            ax.grid(True, alpha=0.3)
+
+            delta_ax.axhline(0, color='gray', linewidth=1)
+            delta_ax.set_xlabel('Дистанция (метры)')
+            delta_ax.set_ylabel(f"Отставание от {comparison['reference']} (с)")
+            delta_ax.grid(True, alpha=0.3)
+            
+            return get_image_png(fig)
     except Exception as e:
-        print(f"Ошибка создания Speed Trace: {e}")
+        report_error("create_speed_trace_plot", f"Ошибка создания Speed Trace: {e}")
         return None
     
 
+@rendered_plot
 def create_position_changes_plot(year, event_name, session_type): # график изменения позиций
     try:
-        session = ff1.get_session(year, event_name, session_type)
-        session.load(telemetry=False, weather=False)
-        
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        for drv in session.drivers:
-            drv_laps = session.laps.pick_driver(drv)
-            if drv_laps.empty:
-                continue
-                
-            abb = drv_laps['Driver'].iloc[0]
-            style = ff1.plotting.get_driver_style(identifier=abb,
-                                                 style=['color', 'linestyle'],
-                                                 session=session)
-
-            ax.plot(drv_laps['LapNumber'], drv_laps['Position'],
-                    label=abb, **style, alpha=0.8)
-
-        ax.set_ylim([20.5, 0.5])
-        ax.set_yticks([1, 5, 10, 15, 20])
-        ax.set_xlabel('Круг')
-        ax.set_ylabel('Позиция')
+        compact = load_compact(year, event_name, session_type)
+        index = compact.index
         
-        plt.title(f"Изменение позиций в гонке: {event_name} {year}")
-        ax.legend(bbox_to_anchor=(1.0, 1.02), loc='upper left', fontsize='small', ncol=1)
-        plt.grid(True, alpha=0.2)
-        plt.tight_layout()
-        
-        return get_image_base64()
+        with new_figure(figsize=(10, 6)) as fig:
+            ax = fig.add_subplot()
+            
+            for abb in compact.results['Abbreviation']: # порядок легенды как раньше по session.drivers
+                drv_laps = index.driver_laps(abb)
+                if drv_laps.empty:
+                    continue
+                    
+                style = compact.driver_style(abb)
+
+                ax.plot(drv_laps['LapNumber'], drv_laps['Position'],
+                        label=abb, **style, alpha=0.8)
+
+            ax.set_ylim([20.5, 0.5])
+            ax.set_yticks([1, 5, 10, 15, 20])
+            ax.set_xlabel('Круг')
+            ax.set_ylabel('Позиция')
+            
+            ax.set_title(f"Изменение позиций в гонке: {event_name} {year}")
+            ax.legend(bbox_to_anchor=(1.0, 1.02), loc='upper left', fontsize='small', ncol=1)
+            ax.grid(True, alpha=0.2)
+            fig.tight_layout()
+            
+            return get_image_png(fig)
     except Exception as e:
-        print(f"Ошибка создания графика позиций: {e}")
+        report_error("create_position_changes_plot", f"Ошибка создания графика позиций: {e}")
         return None
\ No newline at end of file
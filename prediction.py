@@ -0,0 +1,57 @@
+# история трассы, текущая форма и экспертный прогноз по таблице результатов; общие для главной страницы и backtest.py
+
+HISTORY_YEARS = 5 # сколько прошлых сезонов смотрит история трассы
+
+
+def track_winners(track_results): # победитель каждого года по результатам первых гонок на трассе, по возрастанию года
+    winners = track_results.sort_values(["Year", "Position"]).groupby("Year").head(1)
+    return [{
+        "year": int(winner["Year"]),
+        "driver": winner["Driver"],
+        "winner": winner["FullName"],
+        "team": winner["Team"],
+        "points": float(winner["Points"])
+    } for _, winner in winners.iterrows()]
+
+
+def current_form(results, driver_count=10): # средние очки за три последние гонки, results - гонки сезона до нужного момента
+    rounds = sorted(results["Round"].unique())
+    if len(rounds) < 2:
+        return []
+
+    recent_results = results[results["Round"].isin(rounds[-3:])]
+    form = recent_results.groupby("Driver", sort=False)["Points"].agg(["mean", "size"])
+    form["mean"] = form["mean"].round(1)
+    form = form.sort_values("mean", ascending=False, kind="stable").head(driver_count)
+
+    return [{
+        "driver": driver,
+        "avg_points": float(row["mean"]),
+        "races": int(row["size"])
+    } for driver, row in form.iterrows()]
+
+
+def expert_picks(track_history, current_form): # из чего складывается прогноз; None - без истории трассы прогноза нет
+    if not track_history:
+        return None
+
+    recent_winners = track_history[-2:]
+    dominant_teams = {}
+    for h in track_history:
+        dominant_teams[h["team"]] = dominant_teams.get(h["team"], 0) + 1
+    best_team = max(dominant_teams, key=dominant_teams.get)
+
+    return {
+        # один и тот же победитель двух последних гонок на трассе
+        "repeat_winner": recent_winners[0] if len(recent_winners) >= 2 and recent_winners[0]["winner"] == recent_winners[1]["winner"] else None,
+        "best_team": best_team if dominant_teams[best_team] >= 2 else None,
+        "form_leader": current_form[0] if current_form else None
+    }
+
+
+def expert_favourite(track_history, current_form): # гонщик, которого прогноз называет первым, или None
+    picks = expert_picks(track_history, current_form)
+    if picks is None:
+        return None
+    favourite = picks["repeat_winner"] or picks["form_leader"]
+    return favourite["driver"] if favourite else None
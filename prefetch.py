@@ -0,0 +1,82 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import report_error
+from session_store import TELEMETRY, session_store
+
+
+PREFETCH_WORKERS = int(os.environ.get("F1_PREFETCH_WORKERS", 2)) # сколько сессий грузится заранее одновременно
+PREFETCH_QUEUE = int(os.environ.get("F1_PREFETCH_QUEUE", 8)) # больше ожидающих загрузок не ставим, чтобы не забить сервер
+
+
+class Prefetcher: # догружает сессию, пока пользователь выбирает гонщиков, к отправке формы она уже в session_store
+    def __init__(self, store=session_store, level=TELEMETRY, workers=PREFETCH_WORKERS, queue_limit=PREFETCH_QUEUE):
+        self.store = store
+        self.level = level # страница анализа читает круги и телеметрию
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._lock = threading.RLock() # отмена future сразу вызывает _forget в том же потоке
+        self._futures = {} # сессия -> future, одна загрузка на сессию
+        self._clients = {} # клиент -> сессия, которую он сейчас выбрал
+        self.started = 0
+        self.cancelled = 0
+        self.skipped = 0
+
+    def prefetch(self, client_id, year, event_name, session_type): # клиент выбрал сессию, предыдущий выбор отменяется
+        key = (int(year), event_name, session_type)
+        with self._lock:
+            self._cancel_locked(client_id, keep=key)
+            self._clients[client_id] = key
+
+            if key in self._futures or self.store.has(*key, self.level):
+                return
+            pending = sum(1 for future in self._futures.values() if not future.running())
+            if pending >= self.queue_limit:
+                self.skipped += 1
+                return
+            future = self._executor.submit(self._load, key)
+            self._futures[key] = future
+            self.started += 1
+        future.add_done_callback(lambda _: self._forget(key))
+
+    def cancel(self, client_id): # клиент ушел со страницы или поменял гран-при/сессию
+        with self._lock:
+            self._cancel_locked(client_id)
+            self._clients.pop(client_id, None)
+
+    def _cancel_locked(self, client_id, keep=None):
+        key = self._clients.get(client_id)
+        if key is None or key == keep:
+            return
+        if any(k == key for c, k in self._clients.items() if c != client_id):
+            return # эту же сессию ждет другой клиент
+        future = self._futures.get(key)
+        # начатую загрузку fastf1 прервать нельзя, она просто прогреет кеш; отменяем только ожидающие в очереди
+        if future is not None and future.cancel():
+            self._futures.pop(key, None)
+            self.cancelled += 1
+
+    def _load(self, key):
+        try:
+            self.store.get(*key, self.level)
+        except Exception as e:
+            report_error("prefetch", f"Ошибка предзагрузки сессии {key}: {e}")
+
+    def _forget(self, key):
+        with self._lock:
+            self._futures.pop(key, None)
+            for client_id in [c for c, k in self._clients.items() if k == key]:
+                del self._clients[client_id] # загружено, отменять больше нечего
+
+    def stats(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "in_flight": len(self._futures)
+            }
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,182 @@
+# Предварительное заполнение кеша fastf1 и локальных таблиц результатов, чтобы первые посетители не ждали загрузок.
+#
+#   python prewarm.py --from 2018 --to 2025 --sessions R,Q --mode results --workers 4
+#   python prewarm.py --from 2024 --mode full --events "Monaco,Italian"
+#   python prewarm.py --fixtures /path/to/ff1_cache      # без сети, данные только из готового кеша fastf1
+#
+# Прерванный запуск продолжается с места остановки: готовые сессии записываются в --checkpoint.
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import fastf1 as ff1
+import pandas as pd
+
+from session_store import DATA_PARTS, FULL, RESULTS
+
+
+CACHE_DIR = "cache"
+CHECKPOINT_FILE = os.path.join(CACHE_DIR, "prewarm_checkpoint.jsonl")
+MODES = {"results": RESULTS, "full": FULL} # full - все данные, включая телеметрию, погоду и сообщения
+
+
+def setup_cache(cache_dir, offline): # в каждом процессе пула свой экземпляр fastf1, настраиваем его заново
+    os.makedirs(cache_dir, exist_ok=True)
+    ff1.Cache.enable_cache(cache_dir)
+    if offline:
+        ff1.Cache.offline_mode(True) # запросы в сеть запрещены, все берется из кеша
+    ff1.set_log_level("ERROR")
+
+
+def warm_session(year, event_name, session_type, mode): # выполняется в процессе пула, в session_store сессию не кладем
+    started = time.perf_counter()
+    try:
+        level = MODES[mode]
+        session = ff1.get_session(year, event_name, session_type)
+        session.load(**{part: part in level for part in DATA_PARTS})
+        if session.results is None or session.results.empty:
+            return time.perf_counter() - started, "нет результатов"
+        return time.perf_counter() - started, None
+    except Exception as e:
+        return time.perf_counter() - started, str(e)
+
+
+def checkpoint_key(year, event_name, session_type):
+    return f"{year}|{event_name}|{session_type}"
+
+
+def read_checkpoint(path, mode): # сессии, уже прогретые в этом или более полном режиме
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # строка могла оборваться при аварийной остановке
+            if mode == "results" or entry["mode"] == "full":
+                done.add(checkpoint_key(entry["year"], entry["event"], entry["session"]))
+    return done
+
+
+def session_finished(event, session_type): # сессия есть в формате уикенда и уже прошла
+    try:
+        session_date = event.get_session_date(session_type, utc=True)
+    except ValueError:
+        return False # например, спринта на этом этапе не было
+    return session_date + pd.Timedelta(hours=4) < pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+
+def plan_sessions(years, session_types, event_filter): # список (год, гран-при, сессия) к прогреву
+    plan = []
+    for year in years:
+        try:
+            schedule = ff1.get_event_schedule(year, include_testing=False)
+        except Exception as e:
+            print(f"Ошибка ff1 получения расписания {year}: {e}")
+            continue
+        for _, event in schedule.iterrows():
+            if event_filter and not any(name.lower() in event["EventName"].lower() for name in event_filter):
+                continue
+            for session_type in session_types:
+                if session_finished(event, session_type):
+                    plan.append((year, event["EventName"], session_type))
+    return plan
+
+
+def report(timings, failures, elapsed):
+    print(f"\nПрогрето сессий: {len(timings)}, ошибок: {len(failures)}, всего {elapsed:.1f} с")
+    if timings:
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:10]
+        print("Самые долгие:")
+        for key, seconds in slowest:
+            print(f"  {key.replace('|', ' ')}: {seconds:.1f} с")
+    for key, error in failures.items():
+        print(f"  ошибка {key.replace('|', ' ')}: {error}")
+
+
+def sync_results(years): # производные таблицы результатов строятся из уже прогретого кеша
+    from results_store import results_store
+    results_store.open()
+    for year in years:
+        started = time.perf_counter()
+        try:
+            complete = results_store.sync(year)
+            print(f"Таблица результатов {year}: {time.perf_counter() - started:.1f} с" + ("" if complete else ", загружены не все гонки"))
+        except Exception as e:
+            print(f"Ошибка синхронизации результатов {year}: {e}")
+
+
+def run(years, session_types, mode, workers, checkpoint, event_filter=None, fixtures=None):
+    cache_dir = fixtures or CACHE_DIR
+    offline = fixtures is not None
+    setup_cache(cache_dir, offline)
+
+    done = read_checkpoint(checkpoint, mode)
+    plan = [item for item in plan_sessions(years, session_types, event_filter) if checkpoint_key(*item) not in done]
+    print(f"К прогреву {len(plan)} сессий (уже готово по чекпоинту: {len(done)}), режим {mode}, процессов {workers}")
+
+    timings = {}
+    failures = {}
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(checkpoint) or ".", exist_ok=True)
+    with open(checkpoint, "a", encoding="utf-8") as checkpoint_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=setup_cache, initargs=(cache_dir, offline)) as executor:
+        futures = {executor.submit(warm_session, *item, mode): item for item in plan}
+        for number, future in enumerate(as_completed(futures), 1):
+            year, event_name, session_type = futures[future]
+            key = checkpoint_key(year, event_name, session_type)
+            seconds, error = future.result()
+            if error is None:
+                timings[key] = seconds
+                checkpoint_file.write(json.dumps({"year": year, "event": event_name, "session": session_type,
+                                                  "mode": mode, "seconds": round(seconds, 2)}, ensure_ascii=False) + "\n")
+                checkpoint_file.flush() # запись сразу на диск, чтобы после прерывания не грузить заново
+            else:
+                failures[key] = error
+            status = "ошибка" if error else "ok"
+            print(f"[{number}/{len(plan)}] {year} {event_name} {session_type}: {seconds:.1f} с, {status}")
+
+    report(timings, failures, time.perf_counter() - started)
+    if "R" in session_types:
+        sync_results(years)
+    return not failures
+
+
+def main():
+    current_year = datetime.now().year
+    parser = argparse.ArgumentParser(description="Заполнение кеша fastf1 и таблиц результатов заранее")
+    parser.add_argument("--from", dest="first", type=int, default=2018)
+    parser.add_argument("--to", dest="last", type=int, default=current_year)
+    parser.add_argument("--sessions", default="R", help="типы сессий через запятую, например R,Q,S")
+    parser.add_argument("--events", default="", help="часть названия гран-при через запятую, по умолчанию все")
+    parser.add_argument("--mode", choices=sorted(MODES), default="results")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="игнорировать чекпоинт и прогреть все заново")
+    parser.add_argument("--fixtures", help="папка с готовым кешем fastf1, работа без сети")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    ok = run(
+        years=range(args.first, args.last + 1),
+        session_types=[s for s in args.sessions.split(",") if s],
+        mode=args.mode,
+        workers=max(1, args.workers),
+        checkpoint=args.checkpoint,
+        event_filter=[e for e in args.events.split(",") if e],
+        fixtures=args.fixtures
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from metrics import report_error
+
+
+# thread - общий кеш сессий, графики рисуются одновременно без блокировок, но Python-часть matplotlib упирается в GIL;
+# process - настоящий параллелизм на ядрах, но у каждого процесса свой session_store, и сессия грузится в нем заново
+RENDER_MODE = os.environ.get("F1_RENDER_MODE", "thread")
+RENDER_WORKERS = int(os.environ.get("F1_RENDER_WORKERS", min(8, os.cpu_count() or 1)))
+
+
+class RenderPool: # параллельный рендер графиков одного запроса
+    def __init__(self, mode=RENDER_MODE, workers=RENDER_WORKERS):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Неизвестный режим рендера: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self): # пул создается при первом запросе и живет вместе с приложением
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+            return self._executor
+
+    def completed(self, jobs): # jobs: {имя: (функция, аргументы)} -> (имя, результат или None) по мере готовности
+        executor = self._get_executor()
+        futures = {executor.submit(func, *args): name for name, (func, args) in jobs.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e: # ошибка одного графика не ломает остальные
+                report_error("render_pool", f"Ошибка рендера {name}: {e}")
+                result = None
+            yield name, result
+
+    def run(self, jobs): # jobs: {имя: (функция, аргументы)} -> {имя: результат или None}
+        return dict(self.completed(jobs))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+render_pool = RenderPool()
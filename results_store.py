@@ -0,0 +1,156 @@
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+
+from circuit_index import FIRST_SEASON, circuit_index, circuit_key
+from metrics import report_error
+from session_store import RESULTS, load_session
+
+
+RESULTS_DIR = os.path.join("cache", "results") # по одному Arrow файлу на сезон рядом с кешем fastf1
+SYNC_TTL = 30 * 60 # как часто проверять текущий сезон на новые гонки
+
+SCHEMA = pa.schema([
+    ("Year", pa.int16()),
+    ("Round", pa.int16()),
+    ("Circuit", pa.string()),
+    ("EventName", pa.string()),
+    ("Driver", pa.string()),
+    ("FullName", pa.string()),
+    ("Team", pa.string()),
+    ("GridPosition", pa.float32()),
+    ("Position", pa.float32()),
+    ("Points", pa.float32()),
+    ("Status", pa.string()),
+])
+
+
+class ResultsStore: # локальная таблица результатов всех гонок с 2018 года
+    def __init__(self, path=RESULTS_DIR):
+        self.path = path
+        self._tables = {} # год -> pa.Table, отображенная в память
+        self._frames = {} # год -> pandas копия для запросов
+        self._synced_at = {}
+        self._complete = set() # прошедшие сезоны, в которых сохранены все гонки
+        self._opened = False
+        self._lock = threading.RLock()
+
+    def _season_path(self, year):
+        return os.path.join(self.path, f"{year}.arrow")
+
+    def open(self): # отображаем в память все сохраненные сезоны, вызывается при старте
+        with self._lock:
+            if self._opened:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            for file_path in glob.glob(os.path.join(self.path, "*.arrow")):
+                try:
+                    year = int(os.path.splitext(os.path.basename(file_path))[0])
+                    with pa.memory_map(file_path, "r") as source:
+                        self._tables[year] = pa.ipc.open_file(source).read_all()
+                except Exception as e:
+                    report_error("results_store", f"Ошибка чтения результатов {file_path}: {e}")
+            self._opened = True
+
+    def _write(self, year, table): # атомарная запись: сначала во временный файл, потом замена
+        tmp_path = f"{self._season_path(year)}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, SCHEMA) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, self._season_path(year))
+        with pa.memory_map(self._season_path(year), "r") as source:
+            self._tables[year] = pa.ipc.open_file(source).read_all()
+        self._frames.pop(year, None)
+
+    def sync(self, year): # догружаем завершенные гонки сезона, которых еще нет в таблице; True - в таблице все завершенные гонки
+        schedule = circuit_index.schedule(year)
+        completed = schedule[(schedule["RoundNumber"] > 0) & (schedule["EventDate"] < datetime.now())]
+        table = self._tables.get(year)
+        stored_rounds = set(table.column("Round").to_pylist()) if table is not None else set()
+
+        rows = []
+        complete = True
+        for _, event in completed.iterrows():
+            round_number = int(event["RoundNumber"])
+            if round_number in stored_rounds:
+                continue
+            try:
+                session = load_session(year, event["EventName"], "R", RESULTS)
+                results = session.results
+                if results is None or results.empty: # результатов еще нет, попробуем при следующей синхронизации
+                    complete = False
+                    continue
+                circuit = circuit_key(event["Location"], event["Country"])
+                for _, result in results.iterrows():
+                    rows.append({
+                        "Year": year,
+                        "Round": round_number,
+                        "Circuit": circuit,
+                        "EventName": event["EventName"],
+                        "Driver": result["Abbreviation"],
+                        "FullName": result["FullName"],
+                        "Team": result["TeamName"],
+                        "GridPosition": result["GridPosition"],
+                        "Position": result["Position"],
+                        "Points": result["Points"],
+                        "Status": result["Status"]
+                    })
+            except Exception as e:
+                report_error("results_store", f"Ошибка ff1 загрузки результатов {year} {event['EventName']}: {e}")
+                complete = False
+
+        if rows:
+            new_rows = pa.Table.from_pandas(pd.DataFrame(rows), schema=SCHEMA, preserve_index=False)
+            merged = pa.concat_tables([table, new_rows]) if table is not None else new_rows
+            merged = merged.sort_by([("Round", "ascending"), ("Position", "ascending")])
+            self._write(year, merged)
+        return complete
+
+    def _fresh(self, year, current_year): # прошедший полный сезон синхронизируем один раз, остальные - раз в SYNC_TTL
+        synced_at = self._synced_at.get(year)
+        if synced_at is None:
+            return False
+        return (year < current_year and year in self._complete) or time.time() - synced_at < SYNC_TTL
+
+    def _ensure(self, years):
+        self.open()
+        current_year = datetime.now().year
+        for year in years:
+            if year < FIRST_SEASON or year > current_year:
+                continue
+            if self._fresh(year, current_year):
+                continue
+            with self._lock:
+                if self._fresh(year, current_year): # пока ждали блокировку, сезон синхронизировал другой поток
+                    continue
+                try:
+                    if self.sync(year) and year < current_year: # текущий сезон еще не закончен
+                        self._complete.add(year)
+                    self._synced_at[year] = time.time()
+                except Exception as e:
+                    report_error("results_store", f"Ошибка синхронизации результатов {year}: {e}")
+
+    def frame(self, years): # результаты выбранных сезонов одним датафреймом
+        years = list(years)
+        self._ensure(years)
+        frames = []
+        with self._lock:
+            for year in years:
+                if year not in self._tables:
+                    continue
+                if year not in self._frames:
+                    self._frames[year] = self._tables[year].to_pandas().astype(
+                        {"GridPosition": float, "Position": float, "Points": float} # считаем в float64, чтобы округление совпадало с fastf1
+                    )
+                frames.append(self._frames[year])
+        if not frames:
+            return pd.DataFrame({field.name: pd.Series(dtype=field.type.to_pandas_dtype()) for field in SCHEMA})
+        return pd.concat(frames, ignore_index=True)
+
+
+results_store = ResultsStore()
@@ -0,0 +1,190 @@
+import gzip
+import json
+import struct
+
+import numpy as np
+
+from lap_compare import compare_fastest_laps, mini_sectors
+from metrics import report_error
+from stint_model import compound_summary, stint_table
+from compact_session import quick_laps
+from session_store import TELEMETRY, load_compact
+
+
+# данные графиков страницы анализа в виде колонок: по каждому гонщику типизированные массивы, браузер рисует сам
+BINARY_MAGIC = b"F1D1"
+BINARY_ALIGN = 8 # выравнивание массивов, чтобы в JS их можно было открыть как Float32Array/Int32Array без копирования
+GZIP_MIN_BYTES = 1024 # маленькие ответы не сжимаем
+JSON_DECIMALS = 2
+
+
+def lap_times_ms(laps): # время круга в целых миллисекундах
+    return (laps['LapTime'].dt.total_seconds().to_numpy() * 1000).round().astype(np.int32)
+
+
+def get_lap_data(year, event_name, session_type, selected_drivers): # быстрые круги выбранных гонщиков, как на графике темпа
+    try:
+        compact = load_compact(year, event_name, session_type)
+
+        drivers = {}
+        for driver in selected_drivers:
+            laps = compact.index.driver_laps(driver)
+            if laps.empty:
+                continue
+            clean_laps = quick_laps(laps)
+            drivers[driver] = {
+                "color": compact.team_color(laps['Team'].iloc[0]),
+                "lap": clean_laps['LapNumber'].to_numpy().astype(np.int16),
+                "time_ms": lap_times_ms(clean_laps)
+            }
+        return {"kind": "laps", "year": year, "event": event_name, "session": session_type, "drivers": drivers}
+
+    except Exception as e:
+        report_error("get_lap_data", f"Ошибка получения данных темпа: {e}")
+        return None
+
+
+def comparison_payload(kind, year, event_name, session_type, selected_drivers, channels): # быстрые круги на общей сетке дистанции
+    try:
+        comparison = compare_fastest_laps(load_compact(year, event_name, session_type, TELEMETRY), selected_drivers)
+        if comparison is None:
+            return None
+
+        drivers = {}
+        for row, driver in enumerate(comparison["drivers"]):
+            drivers[driver] = {"color": comparison["colors"][row]}
+            drivers[driver].update({channel: comparison[channel][row] for channel in channels})
+        return {"kind": kind, "year": year, "event": event_name, "session": session_type,
+                "reference": comparison["reference"], "distance": comparison["distance"], "drivers": drivers}
+
+    except Exception as e:
+        report_error(f"get_{kind}_data", f"Ошибка сравнения быстрых кругов: {e}")
+        return None
+
+
+def get_speed_data(year, event_name, session_type, selected_drivers): # скорость и отставание от самого быстрого по дистанции
+    return comparison_payload("speed", year, event_name, session_type, selected_drivers, ("speed", "delta"))
+
+
+def get_delta_data(year, event_name, session_type, selected_drivers): # только накопленное отставание от самого быстрого
+    return comparison_payload("delta", year, event_name, session_type, selected_drivers, ("delta",))
+
+
+def get_mini_sector_data(year, event_name, session_type): # время каждого гонщика по мини-секторам лучшего круга
+    try:
+        sectors = mini_sectors(load_compact(year, event_name, session_type, TELEMETRY))
+        if sectors is None:
+            return None
+
+        drivers = {}
+        for row, driver in enumerate(sectors["drivers"]):
+            drivers[driver] = {"color": sectors["colors"][row], "team": sectors["teams"][row], "time": sectors["times"][row]}
+        return {"kind": "minisectors", "year": year, "event": event_name, "session": session_type,
+                "distance": sectors["distance"], "fastest": [sectors["drivers"][row] for row in sectors["fastest"]], "drivers": drivers}
+
+    except Exception as e:
+        report_error("get_mini_sector_data", f"Ошибка расчета мини-секторов: {e}")
+        return None
+
+
+def get_stint_data(year, event_name, session_type): # стинты всех гонщиков и средняя деградация по составам шин
+    try:
+        table = stint_table(load_compact(year, event_name, session_type).index.laps, session_type)
+        if table.empty:
+            return None
+        summary = compound_summary(table)
+        return {"kind": "stints", "year": year, "event": event_name, "session": session_type,
+                "stints": {
+                    "driver": table["Driver"].tolist(),
+                    "compound": table["Compound"].tolist(),
+                    "stint": table["Stint"].to_numpy().astype(np.int8),
+                    "start_lap": table["StartLap"].to_numpy().astype(np.int16),
+                    "end_lap": table["EndLap"].to_numpy().astype(np.int16),
+                    "clean_laps": table["CleanLaps"].to_numpy().astype(np.int16),
+                    "pace": table["Pace"].to_numpy().astype(np.float32),
+                    "degradation": table["Degradation"].to_numpy().astype(np.float32)
+                },
+                "compounds": dict(zip(summary["Compound"], summary["Degradation"].round(4)))}
+
+    except Exception as e:
+        report_error("get_stint_data", f"Ошибка расчета стинтов: {e}")
+        return None
+
+
+def get_position_data(year, event_name, session_type): # позиция каждого гонщика по кругам
+    try:
+        compact = load_compact(year, event_name, session_type)
+
+        drivers = {}
+        for abb in compact.results['Abbreviation']:
+            drv_laps = compact.index.driver_laps(abb)
+            drv_laps = drv_laps[drv_laps['Position'].notna()]
+            if drv_laps.empty:
+                continue
+
+            style = compact.driver_style(abb)
+            drivers[abb] = {
+                "color": style['color'],
+                "dashed": style['linestyle'] != 'solid',
+                "lap": drv_laps['LapNumber'].to_numpy().astype(np.int16),
+                "position": drv_laps['Position'].to_numpy().astype(np.int8)
+            }
+        return {"kind": "positions", "year": year, "event": event_name, "session": session_type, "drivers": drivers}
+
+    except Exception as e:
+        report_error("get_position_data", f"Ошибка получения данных позиций: {e}")
+        return None
+
+
+def to_json(payload): # массивы numpy в списки, компактный JSON без пробелов; NaN и бесконечность - null, JSON.parse их не принимает
+    def convert(value):
+        if isinstance(value, np.ndarray):
+            if value.dtype.kind == "f": # float32 в JSON иначе превращается в длинные хвосты вроде 26.222023010253906
+                values = value.astype(np.float64).round(JSON_DECIMALS)
+                finite = np.isfinite(values)
+                if finite.all():
+                    return values.tolist()
+                return [v if ok else None for v, ok in zip(values.tolist(), finite.tolist())]
+            return value.tolist()
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        if isinstance(value, (float, np.floating)):
+            return float(value) if np.isfinite(value) else None
+        return value
+    return json.dumps(convert(payload), ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def to_binary(payload): # заголовок JSON + сырые little-endian массивы: F1D1 | длина заголовка (uint32) | заголовок | данные
+    buffers = []
+    offset = 0
+
+    def convert(value):
+        nonlocal offset
+        if isinstance(value, np.ndarray):
+            data = np.ascontiguousarray(value, dtype=value.dtype.newbyteorder("<")).tobytes()
+            entry = {"dtype": value.dtype.name, "offset": offset, "length": len(value)}
+            padding = -len(data) % BINARY_ALIGN
+            buffers.append(data + b"\0" * padding)
+            offset += len(data) + padding
+            return entry
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        if isinstance(value, (float, np.floating)): # в заголовке, как в to_json: NaN - null
+            return float(value) if np.isfinite(value) else None
+        return value
+
+    header = json.dumps(convert(payload), ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    header += b" " * (-(len(BINARY_MAGIC) + 4 + len(header)) % BINARY_ALIGN) # данные начинаются с выровненного смещения
+    return BINARY_MAGIC + struct.pack("<I", len(header)) + header + b"".join(buffers)
+
+
+def encode_payload(payload, binary=False): # (тело, mimetype)
+    if binary:
+        return to_binary(payload), "application/octet-stream"
+    return to_json(payload), "application/json"
+
+
+def gzip_body(body): # сжатое тело, если это имеет смысл
+    if len(body) < GZIP_MIN_BYTES:
+        return None
+    return gzip.compress(body, compresslevel=6, mtime=0) # mtime=0, чтобы одинаковые данные давали одинаковые байты
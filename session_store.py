@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import fastf1 as ff1
+import pandas as pd
+
+from compact_session import CompactSession
+from metrics import observe
+
+
+MAX_MEMORY_MB = int(os.environ.get("F1_SESSION_CACHE_MB", 1024)) # лимит памяти под загруженные сессии
+COMPACT_MEMORY_MB = int(os.environ.get("F1_COMPACT_CACHE_MB", 256)) # лимит под компактные сессии для графиков, сезон занимает около 100 МБ
+COMPACT_LOCK_STRIPES = 64 # блокировки сборки компактных сессий, берется по хешу ключа: их число не растет с числом сессий
+
+DATA_PARTS = ("laps", "telemetry", "weather", "messages") # что можно догрузить поверх результатов
+
+# уровни загрузки: какие части нужны поверх результатов, уровни складываются через |, например LAPS | WEATHER
+RESULTS = frozenset()
+LAPS = frozenset({"laps"})
+TELEMETRY = frozenset({"laps", "telemetry"}) # телеметрия fastf1 грузится только вместе с кругами
+WEATHER = frozenset({"weather"})
+MESSAGES = frozenset({"messages"})
+FULL = frozenset(DATA_PARTS)
+
+
+def _frame_bytes(frame): # примерный размер датафрейма в памяти
+    if frame is None:
+        return 0
+    if isinstance(frame, dict):
+        return sum(_frame_bytes(f) for f in frame.values())
+    if isinstance(frame, pd.DataFrame):
+        return int(frame.memory_usage(index=True, deep=False).sum())
+    return 0
+
+
+def estimate_session_bytes(session): # сколько памяти занимает загруженная сессия
+    data = session.__dict__
+    return sum(_frame_bytes(data.get(attr)) for attr in (
+        "_results", "_laps", "_car_data", "_pos_data",
+        "_weather_data", "_race_control_messages", "_track_status", "_session_status"
+    ))
+
+
+class _Entry:
+    def __init__(self):
+        self.session = None
+        self.loaded = None # None - еще не загружалась, иначе множество из DATA_PARTS
+        self.size = 0
+        self.lock = threading.Lock()
+
+
+def _wanted(level): # какие части нужны на уровне, телеметрия только вместе с кругами
+    wanted = set(level)
+    if "telemetry" in wanted:
+        wanted.add("laps")
+    return wanted
+
+
+def _label(key): # "2024 Italian Grand Prix R" в статистике
+    return " ".join(str(part) for part in key)
+
+
+class SessionStore: # общий кеш загруженных сессий fastf1 с LRU вытеснением
+    def __init__(self, max_bytes, compact_bytes=COMPACT_MEMORY_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.compact_bytes = compact_bytes
+        self._entries = OrderedDict()
+        self._compact = OrderedDict() # ключ -> CompactSession, живут дольше полных сессий
+        self._compact_locks = [threading.Lock() for _ in range(COMPACT_LOCK_STRIPES)] # одну компактную сессию собирает один поток
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.upgrades = 0
+        self.evictions = 0
+        self.compact_hits = 0
+        self.compact_builds = 0
+        self.compact_evictions = 0
+        self.skipped = Counter() # сколько раз какая часть не понадобилась при загрузке
+
+    def get(self, year, event_name, session_type, level=FULL):
+        requested = time.perf_counter()
+        key = (int(year), event_name, session_type)
+        wanted = _wanted(level)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry()
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+        with entry.lock: # одну и ту же сессию грузит только один поток, остальные ждут
+            if entry.loaded is not None and wanted <= entry.loaded:
+                with self._lock:
+                    self.hits += 1
+                observe("session_load", time.perf_counter() - requested, result="hit") # включая ожидание чужой загрузки
+                return entry.session
+
+            try:
+                if entry.session is None:
+                    entry.session = ff1.get_session(year, event_name, session_type)
+                parts = wanted | (entry.loaded or set())
+                entry.session.load(**{part: part in parts for part in DATA_PARTS})
+            except Exception:
+                if entry.loaded is None:
+                    with self._lock:
+                        if self._entries.get(key) is entry:
+                            del self._entries[key]
+                raise
+
+            with self._lock:
+                if entry.loaded is None:
+                    self.misses += 1
+                    result = "miss"
+                else:
+                    self.upgrades += 1
+                    result = "upgrade"
+                entry.loaded = parts
+                entry.size = estimate_session_bytes(entry.session)
+                skipped = [part for part in DATA_PARTS if part not in parts]
+                self.skipped.update(skipped)
+                self._evict(keep=key)
+
+            observe("session_load", time.perf_counter() - requested, result=result)
+            return entry.session
+
+    def put(self, year, event_name, session_type, session, level=FULL): # уже загруженная сессия, например синтетическая в бенчмарках
+        entry = _Entry()
+        entry.session = session
+        entry.loaded = set(level)
+        entry.size = estimate_session_bytes(session)
+        key = (int(year), event_name, session_type)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def compact(self, year, event_name, session_type, level=LAPS): # компактная сессия для графиков, полная нужна только для сборки
+        requested = time.perf_counter()
+        key = (int(year), event_name, session_type)
+        wanted = (_wanted(level) & {"laps", "telemetry"}) | {"laps"} # погода и сообщения в компактной сессии не хранятся
+        with self._compact_locks[hash(key) % COMPACT_LOCK_STRIPES]:
+            with self._lock:
+                compact = self._compact.get(key)
+                if compact is not None and wanted <= compact.parts:
+                    self._compact.move_to_end(key)
+                    self.compact_hits += 1
+                    observe("session_load", time.perf_counter() - requested, result="compact")
+                    return compact
+
+            parts = wanted | (compact.parts if compact is not None else set())
+            session = self.get(year, event_name, session_type, parts)
+            compact = CompactSession(session, parts, estimate_session_bytes(session))
+            with self._lock:
+                self._compact[key] = compact
+                self._compact.move_to_end(key)
+                self.compact_builds += 1
+                self._evict_compact(keep=key)
+            return compact
+
+    def has(self, year, event_name, session_type, level=FULL): # сессия уже в памяти на нужном уровне, без загрузки
+        wanted = _wanted(level)
+        key = (int(year), event_name, session_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.loaded is not None and wanted <= entry.loaded:
+                return True
+            compact = self._compact.get(key) # круги и телеметрию графики берут из компактной сессии
+            return compact is not None and wanted <= compact.parts
+
+    def _evict(self, keep): # вытесняем самые давно использованные сессии, пока не влезем в лимит
+        total = sum(e.size for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key).size
+            self.evictions += 1
+
+    def _evict_compact(self, keep):
+        total = sum(c.nbytes for c in self._compact.values())
+        for key in list(self._compact):
+            if total <= self.compact_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._compact.pop(key).nbytes
+            self.compact_evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._compact.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "upgrades": self.upgrades,
+                "evictions": self.evictions,
+                "skipped_parts": dict(self.skipped),
+                "sessions": len(self._entries),
+                "memory_mb": round(sum(e.size for e in self._entries.values()) / 1024 / 1024, 1),
+                "limit_mb": round(self.max_bytes / 1024 / 1024, 1),
+                "entries": {_label(key): round(e.size / 1024 / 1024, 2) for key, e in self._entries.items()},
+                "compact": {
+                    "hits": self.compact_hits,
+                    "builds": self.compact_builds,
+                    "evictions": self.compact_evictions,
+                    "sessions": len(self._compact),
+                    "memory_mb": round(sum(c.nbytes for c in self._compact.values()) / 1024 / 1024, 1),
+                    "limit_mb": round(self.compact_bytes / 1024 / 1024, 1),
+                    # размер компактной сессии и исходной, из которой она собрана
+                    "entries": {_label(key): {"mb": round(c.nbytes / 1024 / 1024, 2), "source_mb": round(c.source_bytes / 1024 / 1024, 2),
+                                              "parts": sorted(c.parts)} for key, c in self._compact.items()}
+                }
+            }
+
+
+session_store = SessionStore(MAX_MEMORY_MB * 1024 * 1024)
+
+
+def load_session(year, event_name, session_type, level=FULL): # вместо ff1.get_session(...) + session.load(...), level - какие данные нужны вызывающему
+    return session_store.get(year, event_name, session_type, level)
+
+
+def load_compact(year, event_name, session_type, level=LAPS): # круги, лучшие круги с телеметрией и цвета для графиков, level - LAPS или TELEMETRY
+    return session_store.compact(year, event_name, session_type, level)
@@ -0,0 +1,160 @@
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from metrics import report_error
+from plot_cache import normalize_args
+
+
+SHARED_CACHE_PATH = os.environ.get("F1_SHARED_CACHE_PATH", os.path.join("cache", "shared.sqlite")) # один файл на всех воркеров сервера
+SHARED_CACHE_ENABLED = os.environ.get("F1_SHARED_CACHE", "1") != "0"
+LIVE_TTL = int(os.environ.get("F1_SHARED_TTL", 10 * 60)) # результаты, которые меняются после новой гонки
+COMPLETED_TTL = int(os.environ.get("F1_SHARED_TTL_COMPLETED", 24 * 60 * 60)) # результаты по завершенным гонкам и сезонам
+LOCK_TIMEOUT = int(os.environ.get("F1_SHARED_LOCK_TIMEOUT", 300)) # дольше чужой расчет не ждем, блокировку умершего воркера забираем
+POLL_INTERVAL = 0.05
+
+
+class SharedCache: # результаты расчетов, общие для процессов сервера: SQLite с блокировкой ключа, чтобы считал один воркер
+    def __init__(self, path=SHARED_CACHE_PATH, enabled=SHARED_CACHE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._local = threading.local() # соединение sqlite3 нельзя делить между потоками и процессами после fork
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0 # сколько раз ждали расчет другого воркера
+        self.errors = 0
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL") # читатели не ждут пишущего
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def key(self, name, args): # функция + нормализованные аргументы
+        raw = json.dumps([name, normalize_args(args)], ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key): # None, если значения нет или оно устарело
+        try:
+            row = self._connection().execute("SELECT value FROM results WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+            return None if row is None else pickle.loads(row[0])
+        except Exception as e:
+            self._count("errors")
+            report_error("shared_cache", f"Ошибка чтения общего кеша: {e}")
+            return None
+
+    def put(self, key, value, ttl):
+        try:
+            connection = self._connection()
+            now = time.time()
+            connection.execute("INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                               (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl))
+            connection.execute("DELETE FROM results WHERE expires <= ?", (now,))
+        except Exception as e:
+            self._count("errors")
+            report_error("shared_cache", f"Ошибка записи общего кеша: {e}")
+
+    def _acquire(self, key, owner): # берем свободную или просроченную блокировку
+        try:
+            now = time.time()
+            cursor = self._connection().execute(
+                "INSERT INTO locks (key, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires WHERE locks.expires <= ?",
+                (key, owner, now + LOCK_TIMEOUT, now))
+            return cursor.rowcount == 1
+        except Exception as e:
+            self._count("errors")
+            report_error("shared_cache", f"Ошибка блокировки общего кеша: {e}")
+            return True # без кеша каждый воркер считает сам, как раньше
+
+    def _release(self, key, owner):
+        try:
+            self._connection().execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
+        except Exception as e:
+            self._count("errors")
+            report_error("shared_cache", f"Ошибка снятия блокировки общего кеша: {e}")
+
+    def try_lock(self, key): # блокировка без ожидания: владелец для unlock или None, если ключ занят
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        if not self.enabled or self._acquire(key, owner):
+            return owner
+        return None
+
+    def unlock(self, key, owner): # снять блокировку можно и из другого потока
+        if self.enabled:
+            self._release(key, owner)
+
+    @contextlib.contextmanager
+    def lock(self, key): # межпроцессная блокировка ключа: внутри только один поток одного воркера, остальные ждут
+        if not self.enabled:
+            yield
+            return
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        acquired = self._acquire(key, owner)
+        if not acquired:
+            self._count("waits")
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            while not acquired and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                acquired = self._acquire(key, owner)
+        try:
+            yield
+        finally:
+            if acquired:
+                self._release(key, owner)
+
+    def get_or_compute(self, key, compute, ttl): # готовое значение или расчет под блокировкой ключа; пустой результат (ошибка) не сохраняется
+        if not self.enabled:
+            return compute()
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+        with self.lock(key):
+            value = self.get(key) # пока ждали блокировку, значение мог посчитать другой воркер
+            if value is not None:
+                self._count("hits")
+                return value
+            self._count("misses")
+            value = compute()
+            if value:
+                self.put(key, value, ttl)
+            return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "waits": self.waits, "errors": self.errors, "enabled": self.enabled}
+
+
+shared_cache = SharedCache()
+
+
+def shared_result(func=None, *, ttl=LIVE_TTL, seasonal=False): # результат функции общий для всех воркеров сервера в течение ttl секунд
+    # seasonal - функция считает от текущего сезона, он входит в ключ: в новом году прошлогодний результат не отдается
+    if func is None:
+        return functools.partial(shared_result, ttl=ttl, seasonal=seasonal)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        scope = [datetime.now().year] if seasonal else []
+        key = shared_cache.key(func.__qualname__, scope + list(args) + sorted(kwargs.items()))
+        return shared_cache.get_or_compute(key, lambda: func(*args, **kwargs), ttl)
+    return wrapper
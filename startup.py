@@ -0,0 +1,65 @@
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+
+
+CACHE_DIR = "cache"
+# модули приложения, которые тянут fastf1, pandas и matplotlib: грузятся в preload, а не при импорте app
+PRELOAD_MODULES = ("analysis_utils", "plotting", "session_data", "session_store", "results_store", "prefetch")
+
+_lock = threading.RLock()
+_initialized = False
+_preloaded = False
+
+
+def lazy_import(name): # модуль исполняется при первом обращении к его атрибуту, до этого import почти ничего не стоит
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def init(): # единственная настройка процесса: кеш fastf1 и matplotlib без окна со стилем fastf1
+    global _initialized
+    if _initialized:
+        return
+    with _lock:
+        if _initialized:
+            return
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        import matplotlib
+        matplotlib.use("Agg")
+        import fastf1
+        import fastf1.plotting
+        fastf1.Cache.enable_cache(CACHE_DIR)
+        fastf1.plotting.setup_mpl(mpl_timedelta_support=True)
+        os.register_at_fork(after_in_child=_reopen_cache)
+        _initialized = True
+
+
+def _reopen_cache(): # enable_cache сразу открывает SQLite http-кеша, соединение мастера после fork использовать нельзя
+    import fastf1
+    fastf1.Cache.enable_cache(CACHE_DIR)
+
+
+def preload(): # init и все тяжелые модули сразу: в мастере gunicorn --preload до fork, воркеры делят эти страницы памяти
+    global _preloaded
+    if _preloaded:
+        return
+    with _lock:
+        if _preloaded:
+            return
+        init()
+        for name in PRELOAD_MODULES:
+            importlib.import_module(name).__name__ # обращение к атрибуту исполняет и отложенный lazy_import модуль
+        from results_store import results_store
+        results_store.open() # сохраненные сезоны отображаются в память
+        _preloaded = True
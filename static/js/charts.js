@@ -0,0 +1,186 @@
+// Графики страницы анализа в браузере по данным /api/session/<год>/<гран-при>/<сессия>/<вид>?format=bin
+// Формат: "F1D1" | длина заголовка (uint32 LE) | JSON заголовок | выровненные little-endian массивы
+
+const TYPED_ARRAYS = {
+  int8: Int8Array,
+  int16: Int16Array,
+  int32: Int32Array,
+  float32: Float32Array,
+  float64: Float64Array
+};
+
+function decodePayload(buffer) { // заменяет описания массивов в заголовке на типизированные массивы поверх buffer
+  const bytes = new Uint8Array(buffer);
+  const magic = String.fromCharCode(...bytes.subarray(0, 4));
+  if (magic !== 'F1D1') throw new Error('неизвестный формат данных');
+
+  const headerLength = new DataView(buffer).getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(bytes.subarray(8, 8 + headerLength)));
+  const dataStart = 8 + headerLength;
+
+  const convert = value => {
+    if (value && typeof value === 'object') {
+      if ('dtype' in value && 'offset' in value && 'length' in value) {
+        return new TYPED_ARRAYS[value.dtype](buffer, dataStart + value.offset, value.length);
+      }
+      for (const key of Object.keys(value)) value[key] = convert(value[key]);
+    }
+    return value;
+  };
+  return convert(header);
+}
+
+async function fetchSessionData(url) {
+  const response = await fetch(url + (url.includes('?') ? '&' : '?') + 'format=bin');
+  if (!response.ok) throw new Error(`HTTP ${response.status}`);
+  return decodePayload(await response.arrayBuffer());
+}
+
+function niceTicks(min, max, count) { // "круглые" деления оси
+  const span = max - min || 1;
+  const step0 = span / count;
+  const magnitude = Math.pow(10, Math.floor(Math.log10(step0)));
+  const step = [1, 2, 5, 10].map(m => m * magnitude).find(s => s >= step0);
+  const ticks = [];
+  for (let t = Math.ceil(min / step) * step; t <= max + 1e-9; t += step) ticks.push(t);
+  return ticks;
+}
+
+function formatLapTime(ms) { // 1:23.456
+  const minutes = Math.floor(ms / 60000);
+  const seconds = (ms % 60000) / 1000;
+  return `${minutes}:${seconds.toFixed(3).padStart(6, '0')}`;
+}
+
+function drawLineChart(canvas, series, options) { // series: [{label, color, dashed, x, y}]
+  const ratio = window.devicePixelRatio || 1;
+  const width = canvas.clientWidth;
+  const height = canvas.clientHeight;
+  canvas.width = width * ratio;
+  canvas.height = height * ratio;
+  const ctx = canvas.getContext('2d');
+  ctx.scale(ratio, ratio);
+
+  const margin = { top: 30, right: options.legendWidth || 80, bottom: 40, left: 70 };
+  const plotWidth = width - margin.left - margin.right;
+  const plotHeight = height - margin.top - margin.bottom;
+
+  let [xMin, xMax, yMin, yMax] = [Infinity, -Infinity, Infinity, -Infinity];
+  for (const s of series) {
+    for (let i = 0; i < s.x.length; i++) {
+      xMin = Math.min(xMin, s.x[i]); xMax = Math.max(xMax, s.x[i]);
+      yMin = Math.min(yMin, s.y[i]); yMax = Math.max(yMax, s.y[i]);
+    }
+  }
+  if (options.yRange) [yMin, yMax] = options.yRange;
+  if (!isFinite(xMin)) return;
+
+  const px = x => margin.left + (x - xMin) / ((xMax - xMin) || 1) * plotWidth;
+  const py = options.invertY
+    ? y => margin.top + (y - yMin) / ((yMax - yMin) || 1) * plotHeight
+    : y => margin.top + (yMax - y) / ((yMax - yMin) || 1) * plotHeight;
+
+  ctx.font = '12px sans-serif';
+  ctx.strokeStyle = 'rgba(0, 0, 0, 0.1)';
+  ctx.fillStyle = '#333';
+  ctx.lineWidth = 1;
+
+  ctx.textAlign = 'right';
+  ctx.textBaseline = 'middle';
+  for (const t of options.yTicks || niceTicks(yMin, yMax, 6)) {
+    ctx.beginPath(); ctx.moveTo(margin.left, py(t)); ctx.lineTo(margin.left + plotWidth, py(t)); ctx.stroke();
+    ctx.fillText(options.formatY ? options.formatY(t) : t, margin.left - 6, py(t));
+  }
+  ctx.textAlign = 'center';
+  ctx.textBaseline = 'top';
+  for (const t of niceTicks(xMin, xMax, 10)) {
+    ctx.beginPath(); ctx.moveTo(px(t), margin.top); ctx.lineTo(px(t), margin.top + plotHeight); ctx.stroke();
+    ctx.fillText(t, px(t), margin.top + plotHeight + 6);
+  }
+  ctx.fillText(options.xLabel, margin.left + plotWidth / 2, height - 16);
+  ctx.font = 'bold 14px sans-serif';
+  ctx.textBaseline = 'bottom';
+  ctx.fillText(options.title, margin.left + plotWidth / 2, margin.top - 8);
+
+  ctx.save();
+  ctx.beginPath(); ctx.rect(margin.left, margin.top, plotWidth, plotHeight); ctx.clip();
+  for (const s of series) {
+    ctx.strokeStyle = s.color;
+    ctx.lineWidth = options.lineWidth || 1.5;
+    ctx.setLineDash(s.dashed ? [6, 4] : []);
+    ctx.beginPath();
+    for (let i = 0; i < s.x.length; i++) {
+      if (i === 0) ctx.moveTo(px(s.x[i]), py(s.y[i])); else ctx.lineTo(px(s.x[i]), py(s.y[i]));
+    }
+    ctx.stroke();
+  }
+  ctx.restore();
+
+  ctx.font = '11px sans-serif';
+  ctx.textAlign = 'left';
+  ctx.textBaseline = 'middle';
+  series.forEach((s, i) => {
+    const y = margin.top + 8 + i * 16;
+    ctx.strokeStyle = s.color;
+    ctx.lineWidth = 2;
+    ctx.setLineDash(s.dashed ? [4, 3] : []);
+    ctx.beginPath(); ctx.moveTo(width - margin.right + 10, y); ctx.lineTo(width - margin.right + 30, y); ctx.stroke();
+    ctx.fillText(s.label, width - margin.right + 36, y);
+  });
+  ctx.setLineDash([]);
+}
+
+function chartOptions(data, view) { // вид данных -> линии и оформление, как на PNG версиях графиков
+  const title = `${data.event} ${data.year}`;
+  switch (view || data.kind) {
+    case 'laps':
+      return {
+        series: Object.entries(data.drivers).map(([driver, d]) => ({ label: driver, color: d.color, x: d.lap, y: d.time_ms })),
+        options: { title: `Анализ темпа: ${title}`, xLabel: 'Круг', formatY: formatLapTime }
+      };
+    case 'speed':
+      return {
+        series: Object.entries(data.drivers).map(([driver, d]) => ({ label: driver, color: d.color, x: data.distance, y: d.speed })),
+        options: { title: `Сравнение скорости: ${title}`, xLabel: 'Дистанция (метры)', lineWidth: 2 }
+      };
+    case 'delta': // накопленное отставание от самого быстрого из выбранных, общая сетка дистанции
+      return {
+        series: Object.entries(data.drivers).map(([driver, d]) => ({ label: driver, color: d.color, x: data.distance, y: d.delta })),
+        options: { title: `Отставание от ${data.reference}, с: ${title}`, xLabel: 'Дистанция (метры)', formatY: t => t.toFixed(2) }
+      };
+    case 'positions':
+      return {
+        series: Object.entries(data.drivers).map(([driver, d]) => ({ label: driver, color: d.color, dashed: d.dashed, x: d.lap, y: d.position })),
+        options: { title: `Изменение позиций в гонке: ${title}`, xLabel: 'Круг', invertY: true, yRange: [0.5, 20.5], yTicks: [1, 5, 10, 15, 20] }
+      };
+  }
+  throw new Error(`неизвестный вид данных ${data.kind}`);
+}
+
+function showFallback(canvas) { // без данных или без canvas показываем PNG с сервера
+  if (!canvas.dataset.fallback) { // PNG версии нет, например у отставания - оно уже на графике сравнения скорости
+    canvas.remove();
+    return;
+  }
+  const img = document.createElement('img');
+  img.src = canvas.dataset.fallback;
+  img.className = 'img-fluid';
+  img.onerror = () => { img.style.display = 'none'; };
+  canvas.replaceWith(img);
+}
+
+async function renderChart(canvas) {
+  try {
+    const data = await fetchSessionData(canvas.dataset.url);
+    const { series, options } = chartOptions(data, canvas.dataset.view);
+    if (!series.length) throw new Error('нет данных');
+    drawLineChart(canvas, series, options);
+  } catch (e) {
+    console.warn(`График ${canvas.dataset.url}: ${e.message}`);
+    showFallback(canvas);
+  }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  document.querySelectorAll('canvas[data-url]').forEach(renderChart);
+});
@@ -0,0 +1,88 @@
+// Страница результата анализа: шаги задачи считаются на сервере, панели заполняются по мере готовности
+// Состояние шагов - опросом /api/jobs/<id>: короткие запросы не держат воркер сервера, пока идет анализ
+
+const POLL_INTERVAL = 1000;
+
+function finishPanel(element) {
+  const spinner = element.closest('.job-panel')?.querySelector('.job-spinner');
+  if (spinner) spinner.remove();
+}
+
+async function showStep(jobId, element, status) { // шаг завершился: подставляем результат в его панель
+  finishPanel(element);
+  const url = `/api/jobs/${jobId}/${element.dataset.step}`;
+
+  if (element.tagName === 'IMG') {
+    if (status !== 'done') return;
+    element.onerror = () => { element.style.display = 'none'; };
+    element.src = url;
+    element.classList.remove('d-none');
+  } else if (element.tagName === 'CANVAS') {
+    element.classList.remove('d-none');
+    if (status !== 'done') {
+      showFallback(element);
+      return;
+    }
+    element.dataset.url = url;
+    renderChart(element);
+  } else {
+    if (status !== 'done') {
+      element.innerHTML = '<p class="text-muted">Нет данных</p>';
+      return;
+    }
+    const response = await fetch(url);
+    element.innerHTML = response.ok ? await response.text() : '<p class="text-muted">Нет данных</p>';
+  }
+}
+
+function watchJob(jobId) {
+  const shown = new Set();
+  const apply = snapshot => {
+    for (const [step, status] of Object.entries(snapshot.steps)) {
+      if ((status === 'done' || status === 'error') && !shown.has(step)) {
+        shown.add(step);
+        document.querySelectorAll(`[data-step="${step}"]`).forEach(element => showStep(jobId, element, status));
+      }
+    }
+  };
+
+  let restarted = false;
+  const restart = async () => { // готовый результат устарел: анализ с параметрами из адреса страницы ставится заново
+    restarted = true;
+    const response = await fetch('/api/jobs', { method: 'POST', body: new URLSearchParams(location.search) });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+  };
+  const giveUp = () => { // задача пропала и после перезапуска: оставшиеся панели без данных
+    document.querySelectorAll('[data-step]').forEach(element => {
+      if (!shown.has(element.dataset.step)) showStep(jobId, element, 'error');
+    });
+  };
+
+  const poll = async () => {
+    try {
+      const response = await fetch(`/api/jobs/${jobId}`);
+      if (response.status === 404) {
+        if (restarted) {
+          giveUp();
+          return;
+        }
+        await restart();
+      } else {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const snapshot = await response.json();
+        apply(snapshot);
+        if (snapshot.done) return;
+      }
+    } catch (e) {
+      console.warn(`Состояние анализа: ${e.message}`);
+    }
+    setTimeout(poll, POLL_INTERVAL);
+  };
+
+  poll();
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  const jobId = document.body.dataset.job;
+  if (jobId) watchJob(jobId);
+});
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+
+QUICK_THRESHOLD = 1.07 # как pick_quicklaps: круги медленнее 107% лучшего - машина безопасности, трафик, ошибки
+MIN_STINT_LAPS = 4 # по меньшему числу чистых кругов наклон не считаем
+FUEL_EFFECT = 0.06 # с на круг: машина легчает примерно на 1.8 кг топлива за круг, около 0.033 с на кг
+FUEL_SESSIONS = ("R",) # поправка только для гонки: на тренировках заправка и длина серий у команд разные
+
+
+def split_stints(laps): # номер стинта каждого круга по PitOutTime и маска кругов, пригодных для модели
+    # круги гонщика должны идти подряд по номеру круга, как в LapIndex.laps
+    driver = laps['Driver'].to_numpy()
+    new_driver = np.r_[True, driver[1:] != driver[:-1]] if len(driver) else np.zeros(0, dtype=bool)
+    pit_out = laps['PitOutTime'].notna().to_numpy()
+    pit_in = laps['PitInTime'].notna().to_numpy()
+    stint = np.cumsum(new_driver | pit_out) - 1 # сквозной номер стинта по всем гонщикам
+
+    lap_time = laps['LapTime'].dt.total_seconds().to_numpy()
+    clean = ~np.isnan(lap_time) & ~pit_in & ~pit_out & (laps['LapNumber'].to_numpy() > 1)
+    if clean.any():
+        clean &= lap_time <= QUICK_THRESHOLD * lap_time[clean].min()
+    return stint, clean
+
+
+def fit_stints(stint, age, lap_time, count): # линейная регрессия время = темп + наклон * возраст шин сразу для всех стинтов
+    # нормальные уравнения МНК по суммам, каждая сумма по всем стинтам считается одним bincount
+    n = np.bincount(stint, minlength=count).astype(np.float64)
+    sx, sy, sxx, sxy = (np.bincount(stint, weights=w, minlength=count) for w in (age, lap_time, age * age, age * lap_time))
+    denominator = n * sxx - sx * sx
+    valid = (n >= MIN_STINT_LAPS) & (denominator > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(valid, (n * sxy - sx * sy) / denominator, np.nan)
+        pace = np.where(n > 0, sy / n, np.nan)
+    return n.astype(int), pace, slope
+
+
+def stint_table(laps, session_type): # строка на стинт: гонщик, шины, круги, средний темп и деградация
+    if laps.empty:
+        return pd.DataFrame()
+    stint, clean = split_stints(laps)
+    starts = np.flatnonzero(np.r_[True, stint[1:] != stint[:-1]])
+    ends = np.r_[starts[1:], len(stint)] - 1
+    lap_number = laps['LapNumber'].to_numpy()
+    age = lap_number - lap_number[starts][stint] # кругов с начала стинта
+
+    lap_time = laps['LapTime'].dt.total_seconds().to_numpy()
+    count, pace, slope = fit_stints(stint[clean], age[clean], lap_time[clean], len(starts))
+
+    driver = laps['Driver'].to_numpy()
+    fuel_effect = FUEL_EFFECT if session_type in FUEL_SESSIONS else 0.0
+    first_stint = np.maximum.accumulate(np.where(np.r_[True, driver[1:] != driver[:-1]], stint, 0))
+    return pd.DataFrame({
+        "Driver": driver[starts],
+        "Team": laps['Team'].to_numpy()[starts],
+        "Stint": (stint - first_stint + 1)[starts],
+        "Compound": laps['Compound'].astype(object).fillna("UNKNOWN").to_numpy()[starts], # у компактных кругов категория
+        "StartLap": lap_number[starts].astype(int),
+        "EndLap": lap_number[ends].astype(int),
+        "CleanLaps": count,
+        "Pace": pace,
+        "Slope": slope, # с на круг по сырому времени, топливо его занижает
+        "Degradation": slope + fuel_effect # с на круг, в гонке с поправкой на сгорание топлива
+    })
+
+
+def compound_summary(table): # средняя деградация по составам, стинты взвешены числом чистых кругов
+    fitted = table[table["Degradation"].notna()]
+    if fitted.empty:
+        return pd.DataFrame(columns=["Compound", "Stints", "Degradation"])
+    weighted = fitted.assign(weighted=fitted["Degradation"] * fitted["CleanLaps"])
+    summary = weighted.groupby("Compound").agg(Stints=("Stint", "size"), laps=("CleanLaps", "sum"), weighted=("weighted", "sum"))
+    summary["Degradation"] = summary["weighted"] / summary["laps"]
+    return summary[["Stints", "Degradation"]].reset_index().sort_values("Degradation")
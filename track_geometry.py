@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+
+
+TRACK_TOLERANCE = float(os.environ.get("F1_TRACK_TOLERANCE", 10)) # допустимое отклонение упрощенной линии, единицы X/Y fastf1 (1/10 м)
+SPEED_BIN = 10 # км/ч, граница цвета на карте скорости сохраняется при переходе между такими интервалами
+
+
+def _segment_distances(points, idx, start, end): # расстояние от точек idx до отрезков start-end, все сразу
+    a = points[start]
+    ab = points[end] - a
+    ap = points[idx] - a
+    length = np.hypot(ab[:, 0], ab[:, 1])
+    cross = np.abs(ab[:, 0] * ap[:, 1] - ab[:, 1] * ap[:, 0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(length > 0, cross / length, np.hypot(ap[:, 0], ap[:, 1]))
+
+
+def rdp_mask(points, tolerance, keep=None): # Рамер-Дуглас-Пекер, все отрезки одного уровня обрабатываются одной векторной операцией
+    n = len(points)
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    mask[[0, n - 1]] = True
+    if keep is not None:
+        mask |= keep
+
+    kept = np.flatnonzero(mask)
+    starts, ends = kept[:-1], kept[1:]
+    while len(starts):
+        lengths = ends - starts - 1 # сколько внутренних точек у каждого отрезка
+        has_inner = lengths > 0
+        starts, ends, lengths = starts[has_inner], ends[has_inner], lengths[has_inner]
+        if not len(starts):
+            break
+
+        owner = np.repeat(np.arange(len(starts)), lengths)
+        group_starts = np.cumsum(lengths) - lengths
+        idx = starts[owner] + 1 + np.arange(lengths.sum()) - group_starts[owner]
+        distances = _segment_distances(points, idx, starts[owner], ends[owner])
+
+        order = np.lexsort((-distances, owner)) # внутри каждого отрезка самая дальняя точка идет первой
+        farthest = order[group_starts]
+        split = distances[farthest] > tolerance
+
+        pivots = idx[farthest][split]
+        mask[pivots] = True
+        starts, ends = np.concatenate([starts[split], pivots]), np.concatenate([pivots, ends[split]])
+    return mask
+
+
+def value_breaks(*channels): # точки, где меняется передача или интервал скорости
+    n = len(channels[0]) if channels else 0
+    breaks = np.zeros(n, dtype=bool)
+    for values in channels:
+        values = np.asarray(values)
+        breaks[1:] |= values[1:] != values[:-1]
+    return breaks
+
+
+def simplify_track(points, *channels, tolerance=None): # индексы точек, которых достаточно для отрисовки линии трассы
+    points = np.asarray(points, dtype=float)
+    if tolerance is None:
+        tolerance = TRACK_TOLERANCE
+    if tolerance <= 0 or len(points) < 3:
+        return np.arange(len(points))
+    return np.flatnonzero(rdp_mask(points, tolerance, keep=value_breaks(*channels) if channels else None))
+
+
+def speed_bins(speed, bin_width=SPEED_BIN):
+    return np.floor(np.asarray(speed) / bin_width)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+
+LOOKBACK_YEARS = 3
+
+# коэффициенты формулы из README: средние очки + (20 - лучшая позиция) * 0.5 + min(5, 10 / std(позиций))
+RATING_COEFFICIENTS = {
+    "base_position": 20,
+    "position_weight": 0.5,
+    "consistency_scale": 10,
+    "consistency_cap": 5
+}
+
+
+def first_race_per_year(results): # если на трассе было две гонки за сезон, берем первую, как и раньше
+    first_round = results.groupby(["Circuit", "Year"])["Round"].transform("min")
+    return results[results["Round"] == first_round]
+
+
+def rating_stats(results): # статистика пар (трасса, гонщик), от коэффициентов не зависит
+    grouped = results.groupby(["Circuit", "Driver"], sort=False)
+    stats = grouped.agg(
+        total_points=("Points", "sum"),
+        races=("Points", "size"),
+        best_position=("Position", "min")
+    )
+    stats["best_position"] = stats["best_position"].fillna(99)
+    position = grouped["Position"]
+    # как np.std в исходном расчете: если среди результатов есть неклассифицированный (NaN), разброс тоже NaN
+    stats["position_std"] = position.std(ddof=0).where(position.count() == stats["races"]).to_numpy()
+    return stats
+
+
+def rating_formula(avg_points, best_position, races, position_std, coefficients): # работает и с массивами коэффициентов для перебора
+    position_bonus = (coefficients["base_position"] - best_position) * coefficients["position_weight"]
+    with np.errstate(divide="ignore"):
+        spread_bonus = coefficients["consistency_scale"] / position_std
+    # min(cap, NaN) в исходном расчете давал cap, np.minimum дал бы NaN и весь рейтинг NaN
+    consistency_bonus = np.where(
+        races > 1,
+        np.where(np.isnan(spread_bonus), coefficients["consistency_cap"], np.minimum(coefficients["consistency_cap"], spread_bonus)),
+        0
+    )
+    return avg_points + position_bonus + consistency_bonus
+
+
+def rating_table(results, coefficients=None, top_count=None): # рейтинг всех пар (трасса, гонщик) за один групповой проход
+    coefficients = {**RATING_COEFFICIENTS, **(coefficients or {})}
+    stats = rating_stats(results)
+
+    avg_points = stats["total_points"] / stats["races"]
+    stats["rating"] = rating_formula(avg_points, stats["best_position"], stats["races"], stats["position_std"].to_numpy(), coefficients).round(1)
+    stats["avg_points"] = avg_points.round(1)
+    stats = stats.reset_index()
+
+    # сортировка устойчивая: при равном рейтинге порядок как в результатах, так же как в старом расчете
+    stats = stats.sort_values(["Circuit", "rating"], ascending=[True, False], kind="stable")
+    if top_count is not None:
+        stats = stats.groupby("Circuit", sort=False).head(top_count)
+    return stats[["Circuit", "Driver", "rating", "avg_points", "races", "best_position"]].reset_index(drop=True)
+
+
+def rate_tracks(results, season, lookback=LOOKBACK_YEARS, coefficients=None, top_count=None): # рейтинги на сезон по lookback предыдущим годам
+    window = results[(results["Year"] >= season - lookback) & (results["Year"] < season)]
+    return rating_table(first_race_per_year(window), coefficients, top_count)
+
+
+def rating_records(table): # строки таблицы рейтинга в формате для шаблонов
+    return [{
+        "driver": row.Driver,
+        "rating": float(row.rating),
+        "avg_points": float(row.avg_points),
+        "races": int(row.races),
+        "best_pos": float(row.best_position)
+    } for row in table.itertuples(index=False)]
+
+
+def ratings_by_circuit(table): # {трасса: [записи рейтинга]}
+    return {circuit: rating_records(group) for circuit, group in table.groupby("Circuit", sort=False)}